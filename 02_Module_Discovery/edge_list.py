@@ -0,0 +1,72 @@
+#edge_list.py
+import random
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+def load_edge_arrays(edge_list_path: str, weighted: bool = False):
+    """
+    Loads a whitespace separated edge list (miRNA, gene[, weight]) into compact arrays.
+
+    Returns (node_names, src, dst, weights): node_names is an object array and
+    src/dst are int32 indices into it. Self-loops are dropped and duplicate
+    undirected edges collapse to the last occurrence, as in nx.read_edgelist.
+    Weights may be signed; unweighted files get weight 1.0 for every edge.
+    """
+    columns = [0, 1, 2] if weighted else [0, 1]
+    names = ['u', 'v', 'weight'][:len(columns)]
+    edges = pd.read_csv(
+        edge_list_path, sep=r'\s+', header=None, usecols=columns, names=names,
+        dtype={'u': str, 'v': str, 'weight': np.float64}, comment='#'
+    )
+    edges = edges[edges['u'] != edges['v']]
+
+    codes, node_names = pd.factorize(np.concatenate([edges['u'].values, edges['v'].values]))
+    n_edges = len(edges)
+    src, dst = codes[:n_edges].astype(np.int32), codes[n_edges:].astype(np.int32)
+    weights = edges['weight'].values if weighted else np.ones(n_edges)
+
+    #canonical (low, high) orientation so u-v and v-u are the same edge
+    lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+    keep = ~pd.DataFrame({'lo': lo, 'hi': hi}).duplicated(keep='last').values
+    return np.asarray(node_names, dtype=object), lo[keep], hi[keep], weights[keep].astype(np.float64)
+
+def adjacency_matrix(num_nodes: int, src, dst, weights):
+    """Symmetric CSR adjacency matrix from the edge arrays."""
+    return sparse.csr_matrix(
+        (np.concatenate([weights, weights]), (np.concatenate([src, dst]), np.concatenate([dst, src]))),
+        shape=(num_nodes, num_nodes)
+    )
+
+def load_lcc_arrays(edge_list_path: str, weighted: bool = False):
+    """
+    Loads an edge list into compact arrays (no networkx graph, no per-edge
+    Python attributes) and keeps its largest connected component.
+    Returns (lcc_names, edges, weights) with edges as an (m, 2) index array,
+    or None if the graph is empty.
+    """
+    node_names, src, dst, weights = load_edge_arrays(edge_list_path, weighted=weighted)
+    if len(node_names) == 0:
+        return None
+
+    _, component = connected_components(adjacency_matrix(len(node_names), src, dst, weights), directed=False)
+    in_lcc = component == np.argmax(np.bincount(component))
+    lcc_nodes = np.flatnonzero(in_lcc)
+    remap = np.full(len(node_names), -1, dtype=np.int64)
+    remap[lcc_nodes] = np.arange(len(lcc_nodes))
+    keep = in_lcc[src]
+    edges = np.column_stack([remap[src[keep]], remap[dst[keep]]])
+    return node_names[lcc_nodes], edges, weights[keep]
+
+def multilevel_membership(num_nodes: int, edges, weights, seed: int = 0):
+    """
+    igraph's multilevel (Louvain) method on |weight|, since modularity needs
+    non-negative weights. The seed is fixed so the same graph always gives the
+    same partition. Returns one community index per node.
+    """
+    import igraph as ig #installed with cdlib
+
+    graph = ig.Graph(n=num_nodes, edges=edges)
+    random.seed(seed) #igraph draws from python's RNG
+    return np.asarray(graph.community_multilevel(weights=np.abs(weights).tolist()).membership)
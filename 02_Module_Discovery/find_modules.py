@@ -3,9 +3,27 @@ import networkx as nx
 from cdlib import algorithms
 import os
 import argparse 
+from edge_list import load_lcc_arrays, multilevel_membership
 
-def find_and_save_modules(edge_list_path: str, output_path: str):
-    print("--- step 1: module discovery (using cdlib/louvain algorithm) ---")
+def load_weighted_lcc(edge_list_path: str):
+    """Largest connected component of a weighted edge list as compact arrays (see edge_list.load_lcc_arrays)."""
+    return load_lcc_arrays(edge_list_path, weighted=True)
+
+def weighted_louvain(lcc_names, edges, weights):
+    """Louvain on |weight| with a fixed seed. Returns a list of modules (lists of node names)."""
+    membership = multilevel_membership(len(lcc_names), edges, weights)
+    return [lcc_names[membership == c].tolist() for c in range(membership.max() + 1)]
+
+def find_and_save_modules(edge_list_path: str, output_path: str, weighted: bool = False):
+    """
+    Finds Louvain modules in the largest connected component and writes one module per line.
+
+    Unweighted runs use cdlib's louvain (python-louvain); weighted runs use igraph's
+    multilevel on |weight|. The two are different implementations, so a weighted file
+    whose weights are all 1.0 does not reproduce the unweighted modules.
+    """
+    algorithm = "igraph multilevel louvain, weighted" if weighted else "cdlib/louvain"
+    print(f"--- step 1: module discovery (using {algorithm} algorithm) ---")
     if not os.path.exists(edge_list_path):
         print(f"ERROR: Input edge list '{edge_list_path}' not found.")
         return 1 #return an error
@@ -16,19 +34,30 @@ def find_and_save_modules(edge_list_path: str, output_path: str):
         os.makedirs(output_dir, exist_ok=True)
 
     print(f"Loading graph from: {edge_list_path}")
-    G = nx.read_edgelist(edge_list_path)
-    if not G.nodes():
-        print("ERROR: The graph is empty. Please check your edge list file.")
-        return 1 #return an error
+    if weighted:
+        weighted_lcc = load_weighted_lcc(edge_list_path)
+        if weighted_lcc is None:
+            print("ERROR: The graph is empty. Please check your edge list file.")
+            return 1 #return an error
+        lcc_names, lcc_edges, lcc_weights = weighted_lcc
+        print(f"Graph loaded. LCC has {len(lcc_names)} nodes and {len(lcc_edges)} weighted edges.")
+    else:
+        G = nx.read_edgelist(edge_list_path)
+        if not G.nodes():
+            print("ERROR: The graph is empty. Please check your edge list file.")
+            return 1 #return an error
         
-    largest_cc = max(nx.connected_components(G), key=len)
-    G_lcc = G.subgraph(largest_cc)
-    print(f"Graph loaded. LCC has {G_lcc.number_of_nodes()} nodes and {G_lcc.number_of_edges()} edges.")
+        largest_cc = max(nx.connected_components(G), key=len)
+        G_lcc = G.subgraph(largest_cc)
+        print(f"Graph loaded. LCC has {G_lcc.number_of_nodes()} nodes and {G_lcc.number_of_edges()} edges.")
 
     print("Running louvain algorithm to find modules...")
     try:
-        coms = algorithms.louvain(G_lcc, randomize=False) #add randomize=False for deterministic results
-        mod_list = coms.communities
+        if weighted:
+            mod_list = weighted_louvain(lcc_names, lcc_edges, lcc_weights)
+        else:
+            coms = algorithms.louvain(G_lcc, randomize=False) #add randomize=False for deterministic results
+            mod_list = coms.communities
         
         if not mod_list:
             print("WARNING: Louvain algorithm did not find any communities.")
@@ -58,10 +87,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Find network modules from an edge list.")
     parser.add_argument("--edgelist", required=True, help="Path to the input edge list file.")
     parser.add_argument("--output", required=True, help="Path to save the output modules file.")
+    parser.add_argument("--weighted", action="store_true", help="Edge list has a third column of (possibly signed) interaction weights (clustered with igraph multilevel instead of cdlib louvain).")
     
     args = parser.parse_args()
 
     #exit with a non-zero code if the function fails
-    exit_code = find_and_save_modules(edge_list_path=args.edgelist, output_path=args.output)
+    exit_code = find_and_save_modules(edge_list_path=args.edgelist, output_path=args.output, weighted=args.weighted)
     if exit_code != 0:
         exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,260 @@
+#module_stability.py
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import networkx as nx
+from cdlib import algorithms
+from multiprocessing import Pool, shared_memory
+from scipy.sparse.csgraph import connected_components
+from edge_list import adjacency_matrix, load_lcc_arrays, multilevel_membership
+from module_statistics import load_module_map
+
+RESAMPLING_MODES = ["bootstrap", "subsample", "perturb"]
+
+#read-only arrays shared with the worker processes (filled by _attach_shared)
+_SHARED = {}
+
+def _share_array(array: np.ndarray):
+    """Copies an array into a new shared memory block; returns (block, spec for workers)."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+def _attach_shared(specs: dict):
+    """Pool initializer: maps the parent's shared blocks as numpy arrays, without copying."""
+    for key, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _SHARED[key + "_block"] = block #keep the mapping alive
+        _SHARED[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+def co_assignment_scores(reference, labels, module_sizes):
+    """
+    For one replicate partition, returns
+    - per node: share of its reference module-mates that landed in the same replicate community
+    - per module: best Jaccard match between the module and any replicate community.
+    Both come from the sparse (reference module, replicate community) contingency counts.
+    """
+    num_labels = labels.max() + 1
+    pair_keys, pair_index, pair_counts = np.unique(
+        reference.astype(np.int64) * num_labels + labels, return_inverse=True, return_counts=True
+    )
+    ref_size = module_sizes[reference]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        node_scores = np.where(ref_size > 1, (pair_counts[pair_index] - 1) / (ref_size - 1), 1.0)
+
+    pair_module, pair_label = pair_keys // num_labels, pair_keys % num_labels
+    label_sizes = np.bincount(labels, minlength=num_labels)
+    jaccard = pair_counts / (module_sizes[pair_module] + label_sizes[pair_label] - pair_counts)
+    best_jaccard = np.zeros(len(module_sizes))
+    np.maximum.at(best_jaccard, pair_module, jaccard)
+    return node_scores, best_jaccard
+
+def load_unweighted_lcc(edge_list_path: str):
+    """
+    Largest connected component of an unweighted edge list as compact arrays, with
+    nodes and edges in the order nx.read_edgelist adds them (nodes by first
+    appearance, edges by first occurrence). python-louvain's result depends on that
+    order, so graphs rebuilt from these arrays partition exactly like find_modules.py.
+    """
+    edges = pd.read_csv(
+        edge_list_path, sep=r'\s+', header=None, usecols=[0, 1], names=['u', 'v'], dtype=str, comment='#'
+    )
+    if edges.empty:
+        return None
+    codes, node_names = pd.factorize(edges[['u', 'v']].values.ravel())
+    src, dst = codes[0::2], codes[1::2]
+    lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+    first = ~pd.DataFrame({'lo': lo, 'hi': hi}).duplicated(keep='first').values
+    src, dst = src[first], dst[first]
+
+    weights = np.ones(len(src))
+    _, component = connected_components(adjacency_matrix(len(node_names), src, dst, weights), directed=False)
+    in_lcc = component == np.argmax(np.bincount(component))
+    lcc_nodes = np.flatnonzero(in_lcc)
+    remap = np.full(len(node_names), -1, dtype=np.int64)
+    remap[lcc_nodes] = np.arange(len(lcc_nodes))
+    keep = in_lcc[src]
+    edges = np.column_stack([remap[src[keep]], remap[dst[keep]]])
+    return np.asarray(node_names, dtype=object)[lcc_nodes], edges, weights[keep]
+
+def louvain_labels(num_nodes: int, edges, weights, weighted: bool):
+    """
+    The Louvain call find_modules.py makes: igraph multilevel with its fixed seed for
+    weighted graphs, cdlib louvain(randomize=False) otherwise. Returns one community
+    index per node.
+    """
+    if weighted:
+        return multilevel_membership(num_nodes, edges, weights)
+    graph = nx.Graph()
+    graph.add_nodes_from(range(num_nodes))
+    graph.add_weighted_edges_from(zip(edges[:, 0].tolist(), edges[:, 1].tolist(), weights.tolist()))
+    labels = np.empty(num_nodes, dtype=np.int64)
+    for community, nodes in enumerate(algorithms.louvain(graph, weight='weight', randomize=False).communities):
+        labels[nodes] = community
+    return labels
+
+def resample_edges(edges, weights, seed, mode, fraction, noise):
+    """One replicate of the edge arrays: resampled ('bootstrap', 'subsample') or reweighted ('perturb')."""
+    rng = np.random.default_rng(seed)
+    num_edges = len(edges)
+    if mode == "bootstrap":
+        #draw num_edges edges with replacement; multiplicity scales the edge weight
+        counts = np.bincount(rng.integers(0, num_edges, num_edges), minlength=num_edges)
+        keep = counts > 0
+        return edges[keep], np.abs(weights[keep]) * counts[keep]
+    if mode == "subsample":
+        keep = rng.random(num_edges) < fraction
+        return edges[keep], np.abs(weights[keep])
+    return edges, np.abs(weights) * rng.lognormal(0.0, noise, num_edges)
+
+def _run_replicate(task):
+    """Resamples/perturbs the shared edge arrays, reruns Louvain and scores the replicate."""
+    seed, mode, fraction, noise, weighted = task
+    reference, module_sizes = _SHARED["reference"], _SHARED["module_sizes"]
+    edges, weights = resample_edges(_SHARED["edges"], _SHARED["weights"], seed, mode, fraction, noise)
+    labels = louvain_labels(len(reference), edges, weights, weighted)
+    return co_assignment_scores(reference, labels, module_sizes)
+
+def assess_module_stability(
+    edge_list_path: str,
+    modules_path: str,
+    output_prefix: str,
+    replicates: int = 100,
+    mode: str = "bootstrap",
+    fraction: float = 0.8,
+    noise: float = 0.3,
+    workers: int = None,
+    seed: int = 0,
+    weighted: bool = False
+):
+    """
+    Measures how reproducible each module is under edge resampling.
+
+    Stability is scored against the modules file written by find_modules.py. Each
+    replicate reruns the same Louvain call on the same graph representation (see
+    louvain_labels), so replicates differ from those modules only through the
+    resampling; weighted must match how the modules file was made.
+
+    The edge arrays are placed in shared memory once and B replicates run across
+    a process pool. Each replicate resamples ('bootstrap' with replacement,
+    'subsample' a fraction) or perturbs ('perturb', log-normal weight noise) the
+    edges, reruns Louvain and returns only per-node and per-module scores, which
+    are summed as results arrive, so memory stays O(nodes) rather than O(B x nodes).
+    """
+    print("--- step 1c: module stability ---")
+    if not os.path.exists(edge_list_path):
+        print(f"ERROR: Input edge list '{edge_list_path}' not found.")
+        return 1
+    if not os.path.exists(modules_path):
+        print(f"ERROR: Modules file '{modules_path}' not found.")
+        return 1
+
+    node_df = load_module_map(modules_path)
+    if node_df.empty:
+        print("Warning: Modules file is empty. Nothing to assess.")
+        return 0
+
+    # --- 1. compact LCC in find_modules.py's graph order, reference = the modules file ---
+    print(f"Loading edges from: {edge_list_path}")
+    lcc = load_lcc_arrays(edge_list_path, weighted=True) if weighted else load_unweighted_lcc(edge_list_path)
+    if lcc is None:
+        print("ERROR: The graph is empty. Please check your edge list file.")
+        return 1
+    lcc_names, edges, weights = lcc
+    node_rows = pd.Series(np.arange(len(lcc_names)), index=lcc_names).reindex(node_df['Node']).values
+    if len(node_df) != len(lcc_names) or np.isnan(node_rows).any():
+        print("ERROR: The modules file does not cover the edge list's largest connected component; was it made from this edge list?")
+        return 1
+    node_rows = node_rows.astype(np.int64)
+    reference = np.empty(len(lcc_names), dtype=np.int32)
+    reference[node_rows] = node_df['Module'].values - 1
+    shared_arrays = {
+        "edges": edges.astype(np.int32),
+        "weights": weights,
+        "reference": reference,
+        "module_sizes": np.bincount(reference),
+    }
+    num_modules = len(shared_arrays["module_sizes"])
+
+    #sanity check: an unperturbed replicate has to reproduce the modules file exactly
+    zero_edges, zero_weights = resample_edges(edges, weights, seed, "perturb", fraction, 0.0)
+    zero_labels = louvain_labels(len(lcc_names), zero_edges, zero_weights, weighted)
+    zero_scores, zero_jaccard = co_assignment_scores(reference, zero_labels, shared_arrays["module_sizes"])
+    if not (np.allclose(zero_scores, 1.0) and np.allclose(zero_jaccard, 1.0)):
+        print("ERROR: A zero-perturbation replicate did not reproduce the modules file (check --weighted matches find_modules.py).")
+        return 1
+    print(f"Graph has {len(lcc_names)} module nodes, {len(edges)} edges and {num_modules} modules; running {replicates} '{mode}' replicates.")
+
+    # --- 2. replicates across a process pool, aggregated incrementally ---
+    blocks, specs = [], {}
+    for key, array in shared_arrays.items():
+        block, specs[key] = _share_array(array)
+        blocks.append(block)
+
+    node_score_sum = np.zeros(len(lcc_names))
+    best_jaccard_sum = np.zeros(num_modules)
+    reproduced_count = np.zeros(num_modules)
+    tasks = [(seed + b, mode, fraction, noise, weighted) for b in range(replicates)]
+    try:
+        with Pool(processes=workers, initializer=_attach_shared, initargs=(specs,)) as pool:
+            for done, (node_scores, best_jaccard) in enumerate(pool.imap_unordered(_run_replicate, tasks), start=1):
+                node_score_sum += node_scores
+                best_jaccard_sum += best_jaccard
+                reproduced_count += best_jaccard >= 0.5
+                if done % max(1, replicates // 10) == 0 or done == replicates:
+                    print(f"completed {done}/{replicates} replicates")
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    # --- 3. per-node and per-module stability tables ---
+    node_df['Co_Assignment_Stability'] = (node_score_sum[node_rows] / replicates).round(4)
+    module_df = node_df.groupby('Module').agg(
+        Size=('Node', 'size'),
+        Mean_Co_Assignment=('Co_Assignment_Stability', 'mean')
+    ).reset_index()
+    module_df['Mean_Co_Assignment'] = module_df['Mean_Co_Assignment'].round(4)
+    module_df['Mean_Best_Jaccard'] = (best_jaccard_sum / replicates).round(4)
+    module_df['Reproduced_Fraction'] = (reproduced_count / replicates).round(4) #replicates with a match of Jaccard >= 0.5
+
+    output_dir = os.path.dirname(output_prefix)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    node_df.to_csv(f"{output_prefix}_Node_Stability.csv", index=False)
+    module_df.to_csv(f"{output_prefix}_Module_Stability.csv", index=False)
+    print(f"Saved stability for {num_modules} modules to '{output_prefix}_*_Stability.csv'")
+    print("--- step 1c complete ---")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assess module stability by rerunning Louvain on resampled edges.")
+    parser.add_argument("--edgelist", required=True, help="Path to the input edge list file.")
+    parser.add_argument("--modules", required=True, help="Path to the modules file written by find_modules.py.")
+    parser.add_argument("--output_prefix", required=True, help="Prefix for the '<prefix>_Node_Stability.csv' and '<prefix>_Module_Stability.csv' outputs.")
+    parser.add_argument("--replicates", type=int, default=100, help="Number of resampled replicates (B).")
+    parser.add_argument("--mode", choices=RESAMPLING_MODES, default="bootstrap", help="How edges are resampled or perturbed in each replicate.")
+    parser.add_argument("--fraction", type=float, default=0.8, help="Fraction of edges kept per replicate in 'subsample' mode.")
+    parser.add_argument("--noise", type=float, default=0.3, help="Log-normal sigma applied to edge weights in 'perturb' mode.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores).")
+    parser.add_argument("--seed", type=int, default=0, help="Base random seed; replicate b uses seed + b.")
+    parser.add_argument("--weighted", action="store_true", help="Edge list has a third column of (possibly signed) interaction weights; use it when the modules came from find_modules.py --weighted.")
+
+    args = parser.parse_args()
+
+    exit_code = assess_module_stability(
+        edge_list_path=args.edgelist,
+        modules_path=args.modules,
+        output_prefix=args.output_prefix,
+        replicates=args.replicates,
+        mode=args.mode,
+        fraction=args.fraction,
+        noise=args.noise,
+        workers=args.workers,
+        seed=args.seed,
+        weighted=args.weighted
+    )
+    if exit_code != 0:
+        exit(exit_code)
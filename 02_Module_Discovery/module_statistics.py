@@ -0,0 +1,148 @@
+#module_statistics.py
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from edge_list import load_edge_arrays
+
+def node_stats_path(output_prefix: str):
+    return f"{output_prefix}_Node_Stats.csv"
+
+def module_stats_path(output_prefix: str):
+    return f"{output_prefix}_Module_Stats.csv"
+
+def load_module_map(modules_path: str):
+    """Returns a frame of (Node, Module) in module file order; modules are numbered from 1."""
+    nodes, module_ids = [], []
+    with open(modules_path, 'r') as f:
+        for i, line in enumerate(f):
+            members = [n for n in line.strip().split(', ') if n]
+            nodes.extend(members)
+            module_ids.extend([i + 1] * len(members))
+    return pd.DataFrame({'Node': nodes, 'Module': module_ids})
+
+NODE_COLUMNS = ['Node', 'Module', 'Node_Type', 'Degree', 'Intra_Degree', 'Inter_Degree', 'Participation_Coefficient',
+                'Strength', 'Intra_Strength', 'Signed_Intra_Strength']
+MODULE_COLUMNS = ['Module', 'Size', 'Num_miRNAs', 'Num_Genes', 'Intra_Edges', 'Boundary_Edges', 'Density', 'Bipartite_Density', 'Intra_Weight']
+
+def compute_module_statistics(edge_list_path: str, modules_path: str, output_prefix: str, weighted: bool = False):
+    """
+    Computes per-node and per-module statistics once so that later steps can load
+    them instead of rebuilding module subgraphs with networkx.
+
+    Node table: Node, Module, Node_Type, Degree, Intra_Degree, Inter_Degree,
+    Participation_Coefficient, Strength, Intra_Strength, Signed_Intra_Strength.
+    Module table: Module, Size, Num_miRNAs, Num_Genes, Intra_Edges, Boundary_Edges,
+    Density, Bipartite_Density, Intra_Weight. Strengths sum absolute edge weights
+    (the signed sum is kept separately); for unweighted lists they equal the degrees.
+    """
+    print("--- step 1b: module statistics ---")
+    if not os.path.exists(edge_list_path):
+        print(f"ERROR: Input edge list '{edge_list_path}' not found.")
+        return 1
+    if not os.path.exists(modules_path):
+        print(f"ERROR: Modules file '{modules_path}' not found.")
+        return 1
+
+    output_dir = os.path.dirname(output_prefix)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    node_df = load_module_map(modules_path)
+    if node_df.empty:
+        print("Warning: Modules file is empty. Writing empty statistics tables.")
+        pd.DataFrame(columns=NODE_COLUMNS).to_csv(node_stats_path(output_prefix), index=False)
+        pd.DataFrame(columns=MODULE_COLUMNS).to_csv(module_stats_path(output_prefix), index=False)
+        return 0
+
+    print(f"Loading edges from: {edge_list_path}")
+    node_names, src, dst, weights = load_edge_arrays(edge_list_path, weighted=weighted)
+    num_nodes = len(node_names)
+    module_of = pd.Series(node_df['Module'].values, index=node_df['Node'].values)
+    node_module = pd.Series(node_names).map(module_of).fillna(0).astype(np.int64).values #0 = not in any module
+
+    #every undirected edge seen from both endpoints
+    node = np.concatenate([src, dst])
+    neighbor_module = node_module[np.concatenate([dst, src])]
+    signed = np.concatenate([weights, weights])
+    strength_w = np.abs(signed)
+    intra = node_module[node] == neighbor_module
+
+    degree = np.bincount(node, minlength=num_nodes)
+    intra_degree = np.bincount(node[intra], minlength=num_nodes)
+    strength = np.bincount(node, weights=strength_w, minlength=num_nodes)
+    intra_strength = np.bincount(node[intra], weights=strength_w[intra], minlength=num_nodes)
+    signed_intra_strength = np.bincount(node[intra], weights=signed[intra], minlength=num_nodes)
+
+    #k_is = number of links from node i into module s
+    pair_keys, k_is = np.unique(node.astype(np.int64) * (node_module.max() + 1) + neighbor_module, return_counts=True)
+    pair_node = pair_keys // (node_module.max() + 1)
+    share_sq = (k_is / degree[pair_node]) ** 2
+    participation = 1.0 - np.bincount(pair_node, weights=share_sq, minlength=num_nodes)
+
+    node_index = pd.Series(np.arange(num_nodes), index=node_names)
+    idx = node_df['Node'].map(node_index)
+    present = idx.notna().values
+    idx = idx.fillna(0).astype(np.int64).values
+
+    def per_node(values, fill=0):
+        return np.where(present, values[idx], fill)
+
+    node_df['Node_Type'] = np.where(node_df['Node'].str.startswith('hsa-'), 'miRNA', 'gene')
+    node_df['Degree'] = per_node(degree)
+    node_df['Intra_Degree'] = per_node(intra_degree)
+    node_df['Inter_Degree'] = node_df['Degree'] - node_df['Intra_Degree']
+    node_df['Participation_Coefficient'] = np.round(per_node(np.where(degree > 0, participation, 0.0), 0.0), 6)
+    node_df['Strength'] = np.round(per_node(strength, 0.0), 6)
+    node_df['Intra_Strength'] = np.round(per_node(intra_strength, 0.0), 6)
+    node_df['Signed_Intra_Strength'] = np.round(per_node(signed_intra_strength, 0.0), 6)
+
+    #per module: intra edges are counted twice in the half-edge table
+    module_df = node_df.groupby('Module').agg(
+        Size=('Node', 'size'),
+        Num_miRNAs=('Node_Type', lambda t: int((t == 'miRNA').sum())),
+        Intra_Degree_Sum=('Intra_Degree', 'sum'),
+        Boundary_Edges=('Inter_Degree', 'sum'),
+        Intra_Strength_Sum=('Intra_Strength', 'sum')
+    ).reset_index()
+    module_df['Num_Genes'] = module_df['Size'] - module_df['Num_miRNAs']
+    module_df['Intra_Edges'] = module_df['Intra_Degree_Sum'] // 2
+    possible = module_df['Size'] * (module_df['Size'] - 1) / 2
+    module_df['Density'] = (module_df['Intra_Edges'] / possible.where(possible > 0)).fillna(0.0).round(6)
+    bipartite_possible = module_df['Num_miRNAs'] * module_df['Num_Genes']
+    module_df['Bipartite_Density'] = (module_df['Intra_Edges'] / bipartite_possible.where(bipartite_possible > 0)).fillna(0.0).round(6)
+    module_df['Intra_Weight'] = (module_df['Intra_Strength_Sum'] / 2).round(6)
+    module_df = module_df[MODULE_COLUMNS]
+
+    node_df.to_csv(node_stats_path(output_prefix), index=False)
+    module_df.to_csv(module_stats_path(output_prefix), index=False)
+    print(f"Saved statistics for {len(node_df)} nodes in {len(module_df)} modules to '{output_prefix}_*_Stats.csv'")
+    print("--- step 1b complete ---")
+    return 0
+
+def load_node_statistics(stats_path: str):
+    """Reads a '<prefix>_Node_Stats.csv' file; node names stay strings (gene IDs are numeric)."""
+    return pd.read_csv(stats_path, dtype={'Node': str})
+
+def load_module_statistics(stats_path: str):
+    """Reads a '<prefix>_Module_Stats.csv' file."""
+    return pd.read_csv(stats_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute per-node and per-module network statistics for discovered modules.")
+    parser.add_argument("--edgelist", required=True, help="Path to the input edge list file.")
+    parser.add_argument("--modules", required=True, help="Path to the modules file written by find_modules.py.")
+    parser.add_argument("--output_prefix", required=True, help="Prefix for the '<prefix>_Node_Stats.csv' and '<prefix>_Module_Stats.csv' outputs.")
+    parser.add_argument("--weighted", action="store_true", help="Edge list has a third column of (possibly signed) interaction weights.")
+
+    args = parser.parse_args()
+
+    exit_code = compute_module_statistics(
+        edge_list_path=args.edgelist,
+        modules_path=args.modules,
+        output_prefix=args.output_prefix,
+        weighted=args.weighted
+    )
+    if exit_code != 0:
+        exit(exit_code)
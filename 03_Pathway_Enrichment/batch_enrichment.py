@@ -0,0 +1,295 @@
+#batch_enrichment.py
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.special import gammaln
+
+RESULT_COLUMNS = ["Term", "Jaccard", "Sample_Odds_Ratio", "Fold_Enrichment", "PValue", "FDR", "Genes"]
+
+def load_gmt_folder(gmt_folder: str):
+    """
+    Reads every .gmt file in the folder (name, description, genes...) into an
+    ordered dict of pathway name -> gene list. Later duplicates of a name are ignored.
+    """
+    gmt_files = sorted(f for f in os.listdir(gmt_folder) if f.endswith(".gmt"))
+    if not gmt_files:
+        raise FileNotFoundError(f"no .gmt files found in '{gmt_folder}'.")
+    pathways = {}
+    for file_name in gmt_files:
+        with open(os.path.join(gmt_folder, file_name), 'r') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 3 or fields[0] in pathways:
+                    continue
+                pathways[fields[0]] = list(dict.fromkeys(g for g in fields[2:] if g))
+    return pathways
+
+def load_universe(universe_path: str, pathways: dict):
+    """
+    Gene universe from a one-gene-per-line file, or the union of all pathway genes
+    when universe_path is None. run_enrichment.R uses the protein-coding Entrez IDs
+    from biomaRt, so only a file with those IDs reproduces its statistics.
+    """
+    if universe_path:
+        with open(universe_path, 'r') as f:
+            return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    return list(dict.fromkeys(g for genes in pathways.values() for g in genes))
+
+def load_cancer_modules(module_folder: str, cancer_types: list = None):
+    """Returns {cancer: [gene list per module]} from '<cancer>_Modules.txt', miRNAs removed."""
+    cancer_modules = {}
+    for file_name in sorted(os.listdir(module_folder)):
+        if not file_name.endswith("_Modules.txt"):
+            continue
+        cancer_type = file_name[:-len("_Modules.txt")]
+        if cancer_types and cancer_type not in cancer_types:
+            continue
+        with open(os.path.join(module_folder, file_name), 'r') as f:
+            module_lines = f.readlines()
+        cancer_modules[cancer_type] = [
+            [n for n in line.strip().split(', ') if n and 'hsa-' not in n]
+            for line in module_lines
+        ]
+    return cancer_modules
+
+def benjamini_hochberg(p_values):
+    """Same adjustment as R's p.adjust(method = 'BH'); NaN p-values stay NaN and do not count towards n."""
+    fdr = np.full(len(p_values), np.nan)
+    valid = np.flatnonzero(~np.isnan(p_values))
+    n = len(valid)
+    if n == 0:
+        return fdr
+    order = valid[np.argsort(p_values[valid])[::-1]]
+    ranked = p_values[order] * n / np.arange(n, 0, -1)
+    fdr[order] = np.minimum(1.0, np.minimum.accumulate(ranked))
+    return fdr
+
+def _hypergeom_log_pmf(x, N, K, n):
+    return (
+        gammaln(K + 1) - gammaln(x + 1) - gammaln(K - x + 1)
+        + gammaln(N - K + 1) - gammaln(n - x + 1) - gammaln(N - K - n + x + 1)
+        - gammaln(N + 1) + gammaln(n + 1) + gammaln(N - n + 1)
+    )
+
+def fisher_greater(a, N, K, n):
+    """
+    One-sided (alternative = "greater") Fisher p-value, P(X >= a) for X ~ Hypergeom(N, K, n).
+
+    Above the mode the upper tail is summed from the log pmf at a with the pmf
+    ratio recurrence; at or below it 1 - P(X <= a - 1) is used instead, so each
+    sum runs away from the mode and its terms only shrink. Only entries whose
+    tail has not converged keep iterating. Much faster than scipy's
+    hypergeom.sf on large arrays of small overlaps.
+    """
+    a = np.asarray(a, dtype=float)
+    K = np.asarray(K, dtype=float)
+    n = np.asarray(n, dtype=float)
+    K, n = np.broadcast_to(K, a.shape), np.broadcast_to(n, a.shape)
+    p_values = np.ones_like(a)
+    mode = np.floor((n + 1) * (K + 1) / (N + 2))
+    low = np.maximum(0.0, n + K - N)
+
+    #upper tail: P(X >= a) = pmf(a) * (1 + pmf(a+1)/pmf(a) + ...)
+    idx = np.flatnonzero(a > mode)
+    log_pmf = _hypergeom_log_pmf(a[idx], N, K[idx], n[idx])
+    total = np.ones(len(idx))
+    live, x, term, K_i, n_i = np.arange(len(idx)), a[idx].copy(), np.ones(len(idx)), K[idx], n[idx]
+    live = live[x < np.minimum(K_i, n_i)]
+    x, term, K_i, n_i = x[live], term[live], K_i[live], n_i[live]
+    while len(live):
+        term *= (K_i - x) * (n_i - x) / ((x + 1) * (N - K_i - n_i + x + 1))
+        x += 1
+        total[live] += term
+        keep = (x < np.minimum(K_i, n_i)) & (term > 1e-17 * total[live])
+        live, x, term, K_i, n_i = live[keep], x[keep], term[keep], K_i[keep], n_i[keep]
+    p_values[idx] = np.exp(log_pmf) * total
+
+    #lower tail: P(X >= a) = 1 - pmf(a-1) * (1 + pmf(a-2)/pmf(a-1) + ...); a <= low means P = 1
+    idx = np.flatnonzero((a <= mode) & (a > low))
+    log_pmf = _hypergeom_log_pmf(a[idx] - 1, N, K[idx], n[idx])
+    total = np.ones(len(idx))
+    live, x, term, K_i, n_i = np.arange(len(idx)), a[idx] - 1, np.ones(len(idx)), K[idx], n[idx]
+    live = live[x > low[idx]]
+    x, term, K_i, n_i, low_i = x[live], term[live], K_i[live], n_i[live], low[idx][live]
+    while len(live):
+        term *= x * (N - K_i - n_i + x) / ((K_i - x + 1) * (n_i - x + 1))
+        x -= 1
+        total[live] += term
+        keep = (x > low_i) & (term > 1e-17 * total[live])
+        live, x, term, K_i, n_i, low_i = live[keep], x[keep], term[keep], K_i[keep], n_i[keep], low_i[keep]
+    p_values[idx] = 1.0 - np.exp(log_pmf) * total
+
+    return np.clip(p_values, 0.0, 1.0)
+
+def run_batch_enrichment(
+    module_folder: str,
+    gmt_folder: str,
+    output_root: str,
+    universe_path: str = None,
+    cancer_types: list = None,
+    chunk_size: int = 256,
+    gmt_universe: bool = False
+):
+    """
+    Runs the run_enrichment.R Fisher test for every module of every cancer at once.
+
+    All modules become columns of one sparse gene x module matrix; the overlap of
+    every pathway with every module comes from a sparse product with the
+    pathway x gene matrix, computed over column chunks of chunk_size modules.
+    P-values, fold enrichment and Jaccard are then computed on the nonzero
+    overlaps only, and results are written back into one
+    'Enrichment_Results_<cancer>' folder per cancer.
+
+    The universe must be given as a file unless gmt_universe explicitly asks for
+    the union of all pathway genes, which changes fold enrichment and p-values
+    relative to run_enrichment.R.
+    """
+    print("--- step 2 (batch): pan-cancer pathway enrichment ---")
+    if not universe_path and not gmt_universe:
+        print("ERROR: No gene universe given. Pass --universe with the protein-coding Entrez IDs used by run_enrichment.R, or --gmt_universe to use the union of all pathway genes.")
+        return 1
+    if universe_path and not os.path.exists(universe_path):
+        print(f"ERROR: Universe file '{universe_path}' not found.")
+        return 1
+
+    # --- 1. pathways and gene universe ---
+    print("loading pathway gene sets (.gmt files)...")
+    try:
+        pathways = load_gmt_folder(gmt_folder)
+    except FileNotFoundError as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(f"loaded {len(pathways)} total pathways.")
+
+    universe = load_universe(universe_path, pathways)
+    universe_size = len(universe)
+    print(f"gene universe defined with {universe_size} genes.")
+
+    # --- 2. modules from all cancers ---
+    cancer_modules = load_cancer_modules(module_folder, cancer_types)
+    if not cancer_modules:
+        print(f"ERROR: No '*_Modules.txt' files found in '{module_folder}'.")
+        return 1
+    module_index = [(cancer, i) for cancer, modules in cancer_modules.items() for i in range(len(modules))]
+    module_genes = [cancer_modules[cancer][i] for cancer, i in module_index]
+    print(f"Loaded {len(module_index)} modules from {len(cancer_modules)} cancer types.")
+
+    #gene vocabulary: universe first, then module genes outside the universe
+    gene_pos = {g: i for i, g in enumerate(universe)}
+    for genes in module_genes:
+        for g in genes:
+            gene_pos.setdefault(g, len(gene_pos))
+    gene_names = np.array(list(gene_pos), dtype=object)
+
+    #pathway x gene, restricted to the universe (intersect(pathway, universe) in R)
+    path_names = np.array(list(pathways), dtype=object)
+    p_rows, p_cols = [], []
+    for row, genes in enumerate(pathways.values()):
+        cols = [gene_pos[g] for g in genes if g in gene_pos and gene_pos[g] < universe_size]
+        p_rows.extend([row] * len(cols))
+        p_cols.extend(cols)
+    path_matrix = sparse.csr_matrix(
+        (np.ones(len(p_rows), dtype=np.int32), (p_rows, p_cols)),
+        shape=(len(path_names), len(gene_names))
+    )
+    path_sizes = np.asarray(path_matrix.sum(axis=1)).ravel()
+
+    #gene x module, one column per module of every cancer
+    m_rows, m_cols = [], []
+    for col, genes in enumerate(module_genes):
+        rows = [gene_pos[g] for g in dict.fromkeys(genes)]
+        m_rows.extend(rows)
+        m_cols.extend([col] * len(rows))
+    module_matrix = sparse.csc_matrix(
+        (np.ones(len(m_rows), dtype=np.int32), (m_rows, m_cols)),
+        shape=(len(gene_names), len(module_genes))
+    )
+    module_sizes = np.asarray(module_matrix.sum(axis=0)).ravel()
+
+    for cancer_type in cancer_modules:
+        os.makedirs(os.path.join(output_root, f"Enrichment_Results_{cancer_type}"), exist_ok=True)
+
+    # --- 3. overlaps and statistics in chunks of modules ---
+    for start in range(0, len(module_genes), chunk_size):
+        stop = min(start + chunk_size, len(module_genes))
+        print(f"analyzing modules {start + 1}-{stop} of {len(module_genes)}")
+        overlaps = (path_matrix @ module_matrix[:, start:stop]).tocsc()
+
+        #contingency cells for every nonzero (pathway, module) overlap
+        a = overlaps.data.astype(float)
+        path_rows = overlaps.indices
+        local_cols = np.repeat(np.arange(stop - start), np.diff(overlaps.indptr))
+        K = path_sizes[path_rows].astype(float)
+        n = module_sizes[start + local_cols].astype(float)
+        b = K - a
+        c = n - a
+        d = universe_size - (a + b + c)
+
+        p_values = fisher_greater(a, universe_size, K, n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            odds_ratios = (a * d) / (b * c) #sample (unconditional) odds ratio; inf when b*c == 0, unlike R fisher.test's conditional MLE
+        fold_enrichments = (a * universe_size) / (n * K)
+        jaccards = a / (a + b + c)
+
+        for local_col in range(stop - start):
+            cancer_type, module_i = module_index[start + local_col]
+            lo, hi = overlaps.indptr[local_col], overlaps.indptr[local_col + 1]
+            if lo == hi:
+                print(f"no overlapping pathways found for {cancer_type} module # {module_i + 1}")
+                continue
+
+            #shared genes in module order, read from the pathway rows of this module's genes
+            gene_order = [gene_pos[g] for g in dict.fromkeys(module_genes[start + local_col])]
+            sub = path_matrix[path_rows[lo:hi]][:, gene_order].tocsr()
+            sub.sort_indices()
+            ordered_names = gene_names[gene_order]
+            shared_genes = [
+                ", ".join(ordered_names[sub.indices[sub.indptr[r]:sub.indptr[r + 1]]])
+                for r in range(hi - lo)
+            ]
+
+            results_df = pd.DataFrame({
+                "Term": path_names[path_rows[lo:hi]],
+                "Jaccard": jaccards[lo:hi],
+                "Sample_Odds_Ratio": odds_ratios[lo:hi],
+                "Fold_Enrichment": fold_enrichments[lo:hi],
+                "PValue": p_values[lo:hi],
+                "FDR": benjamini_hochberg(p_values[lo:hi]),
+                "Genes": shared_genes
+            }, columns=RESULT_COLUMNS)
+            results_df = results_df.sort_values(by="Fold_Enrichment", ascending=False, kind='stable')
+
+            #same file naming as run_enrichment.R so downstream steps pick the files up unchanged
+            output_file_path = os.path.join(output_root, f"Enrichment_Results_{cancer_type}", f"BRCA_Module_{module_i + 1}_pathwayAll_FisherResults.csv")
+            results_df.to_csv(output_file_path, index=False)
+
+    print(f"Saved enrichment results for {len(cancer_modules)} cancer types under '{output_root}'")
+    print("--- step 2 (batch) complete ---")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run pathway enrichment for all modules of all cancers in one sparse batch.")
+    parser.add_argument("--modules", required=True, help="Folder containing the '<cancer>_Modules.txt' files.")
+    parser.add_argument("--gmt", required=True, help="Path to the folder containing .gmt files.")
+    parser.add_argument("--output", required=True, help="Folder in which 'Enrichment_Results_<cancer>' folders are written.")
+    parser.add_argument("--universe", default=None, help="File with one universe gene ID per line (the protein-coding Entrez IDs used by run_enrichment.R).")
+    parser.add_argument("--gmt_universe", action="store_true", help="Use the union of all pathway genes as the universe instead of --universe (statistics differ from run_enrichment.R).")
+    parser.add_argument("--cancers", nargs="*", default=None, help="Restrict the batch to these cancer types.")
+    parser.add_argument("--chunk_size", type=int, default=256, help="Number of modules scored per vectorized pass.")
+
+    args = parser.parse_args()
+
+    exit_code = run_batch_enrichment(
+        module_folder=args.modules,
+        gmt_folder=args.gmt,
+        output_root=args.output,
+        universe_path=args.universe,
+        cancer_types=args.cancers,
+        chunk_size=args.chunk_size,
+        gmt_universe=args.gmt_universe
+    )
+    if exit_code != 0:
+        exit(exit_code)
@@ -6,11 +6,18 @@ import os
 import matplotlib.pyplot as plt
 import re
 import argparse
+from scipy import sparse
+from term_similarity import SIMILARITY_KINDS, load_term_similarity, term_rows, similarity_submatrix
 
-def analyze_and_visualize_modules(enrichment_folder: str, output_folder: str, cancer_type: str):
+def analyze_and_visualize_modules(enrichment_folder: str, output_folder: str, cancer_type: str,
+                                  term_similarity_path: str = None, similarity: str = "jaccard"):
     """
     Processes all module enrichment files in a folder, groups them into functions,
     visualizes the networks, and saves a summary excel file.
+
+    By default pathways are linked by the number of module genes they share. With
+    term_similarity_path, edges are instead sliced from the precomputed library
+    (see term_similarity.py) using the chosen similarity kind.
     """
     
     print("--- step 3: functional grouping & visualization ---")
@@ -18,6 +25,14 @@ def analyze_and_visualize_modules(enrichment_folder: str, output_folder: str, ca
     if not os.path.isdir(enrichment_folder):
         print(f"error: enrichment folder '{enrichment_folder}' not found.")
         return
+
+    library = None
+    if term_similarity_path:
+        print(f"Loading term similarity library: {term_similarity_path}")
+        library = load_term_similarity(term_similarity_path)
+        if similarity not in library:
+            print(f"error: library has no '{similarity}' similarity (was it built with --no_embeddings?).")
+            return
         
     if not os.path.exists(output_folder):
         print(f"Creating output folder: {output_folder}")
@@ -66,13 +81,16 @@ def analyze_and_visualize_modules(enrichment_folder: str, output_folder: str, ca
                 fe_value = fe if fe != float('inf') else significant_paths['Fold_Enrichment'][significant_paths['Fold_Enrichment'] != float('inf')].max() * 1.5
                 pathway_graph.add_node(term, FE=fe_value)
 
-            for path1, path2 in itertools.combinations(pathway_to_geneset.keys(), 2):
-                gene_set1 = pathway_to_geneset[path1]
-                gene_set2 = pathway_to_geneset[path2]
-                
-                num_common_genes = len(gene_set1.intersection(gene_set2))
-                if num_common_genes > 0:
-                    pathway_graph.add_edge(path1, path2, weight=num_common_genes)
+            if library is not None:
+                add_library_edges(pathway_graph, significant_paths['Term'].tolist(), library, similarity)
+            else:
+                for path1, path2 in itertools.combinations(pathway_to_geneset.keys(), 2):
+                    gene_set1 = pathway_to_geneset[path1]
+                    gene_set2 = pathway_to_geneset[path2]
+
+                    num_common_genes = len(gene_set1.intersection(gene_set2))
+                    if num_common_genes > 0:
+                        pathway_graph.add_edge(path1, path2, weight=num_common_genes)
 
             communities = list(nx.community.greedy_modularity_communities(pathway_graph, weight='weight'))
             sorted_communities = sorted([list(c) for c in communities], key=len, reverse=True)
@@ -90,6 +108,17 @@ def analyze_and_visualize_modules(enrichment_folder: str, output_folder: str, ca
 
     print(f"--- step 3 complete. final summary saved to '{summary_excel_path}' ---")
 
+def add_library_edges(graph: nx.Graph, terms: list, library: dict, similarity: str):
+    """Adds the library similarity between the given terms as weighted edges; unknown terms stay isolated."""
+    rows = term_rows(library, terms)
+    known = [i for i, row in enumerate(rows) if row >= 0]
+    if len(known) < len(terms):
+        print(f"{len(terms) - len(known)} pathways are not in the term similarity library.")
+    pairs = sparse.triu(similarity_submatrix(library, rows[known], similarity), k=1).tocoo()
+    graph.add_weighted_edges_from(
+        (terms[known[i]], terms[known[j]], float(w)) for i, j, w in zip(pairs.row, pairs.col, pairs.data)
+    )
+
 def visualize_pathway_network(graph: nx.Graph, communities: list, title: str, output_image_file: str):
     if not communities or not graph.nodes():
         print(f"Skipping visualization for {title} as there are no communities or nodes.")
@@ -131,11 +160,15 @@ if __name__ == "__main__":
     parser.add_argument("--enrichment", required=True, help="Path to the folder with enrichment CSV files.")
     parser.add_argument("--output", required=True, help="Path to the output folder for saving images and summary.")
     parser.add_argument("--cancer", required=True, help="The name of the cancer type (e.g., 'BRCA') for file naming.")
+    parser.add_argument("--term_similarity", default=None, help="Precomputed library from term_similarity.py; pathway edges are sliced from it.")
+    parser.add_argument("--similarity", choices=SIMILARITY_KINDS, default="jaccard", help="Which library similarity to use with --term_similarity.")
     
     args = parser.parse_args()
         
     analyze_and_visualize_modules(
         enrichment_folder=args.enrichment,
         output_folder=args.output,
-        cancer_type=args.cancer
+        cancer_type=args.cancer,
+        term_similarity_path=args.term_similarity,
+        similarity=args.similarity
     )
\ No newline at end of file
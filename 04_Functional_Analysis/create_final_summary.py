@@ -1,15 +1,22 @@
 #create_final_summary.py
 import os
+import sys
 import pandas as pd
 import networkx as nx
 import re
 import argparse 
 
+#module_statistics.py lives with the step 1 scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '02_Module_Discovery'))
+from module_statistics import load_node_statistics
+
 def create_final_summary_table(
     ml_summary_path: str,
     modules_path: str,
     network_path: str,
-    output_csv_path: str
+    output_csv_path: str,
+    node_stats_path: str = None,
+    weighted: bool = False
 ):
     """
     Combines the ML-generated functions with the top miRNAs for each module
@@ -47,12 +54,26 @@ def create_final_summary_table(
         print(f"ERROR: Modules file not found at '{modules_path}'")
         return 1
 
-    print(f"Loading network from: {network_path}")
-    try:
-        G = nx.read_edgelist(network_path)
-    except FileNotFoundError:
-        print(f"ERROR: Network edge list not found at '{network_path}'")
+    #prefer the precomputed module statistics over rebuilding subgraphs from the raw network
+    use_node_stats = bool(node_stats_path and os.path.exists(node_stats_path))
+    if weighted and not use_node_stats:
+        #weighted ranking reads Intra_Strength from module_statistics.py rather than building a weighted networkx graph
+        print("ERROR: Weighted miRNA ranking requires the module statistics file (--node_stats).")
         return 1
+    if use_node_stats:
+        print(f"Loading module statistics from: {node_stats_path}")
+        node_stats = load_node_statistics(node_stats_path)
+        mirna_stats = node_stats[node_stats['Node_Type'] == 'miRNA']
+        rank_column = 'Intra_Strength' if weighted else 'Intra_Degree'
+        mirna_stats = mirna_stats.sort_values(by=rank_column, ascending=False, kind='stable')
+        top_mirnas_by_module = mirna_stats.groupby('Module')['Node'].apply(lambda nodes: nodes.head(3).tolist())
+    else:
+        print(f"Loading network from: {network_path}")
+        try:
+            G = nx.read_edgelist(network_path)
+        except FileNotFoundError:
+            print(f"ERROR: Network edge list not found at '{network_path}'")
+            return 1
 
     final_summary_data = []
 
@@ -75,19 +96,21 @@ def create_final_summary_table(
         if not functions_string or functions_string.strip() == "":
             functions_string = "N/A"
 
-        #--- 2b. calculate the top 3 miRNAs based on local degree ---
+        #--- 2b. calculate the top 3 miRNAs based on local (weighted) degree ---
         top_mirnas_string = "N/A"
         module_nodes = module_list[i]
-        
-        module_subgraph = G.subgraph(module_nodes)
-        mirna_nodes = [node for node in module_nodes if node.startswith('hsa-')]
 
-        if mirna_nodes:
+        if use_node_stats:
+            top_3_mirnas = top_mirnas_by_module.get(module_num, [])
+        else:
+            module_subgraph = G.subgraph(module_nodes)
+            mirna_nodes = [node for node in module_nodes if node.startswith('hsa-')]
             mirna_degrees = dict(module_subgraph.degree(mirna_nodes))
-            if mirna_degrees: #check if dictionary is not empty
-                sorted_mirnas = sorted(mirna_degrees.items(), key=lambda item: item[1], reverse=True)
-                top_3_mirnas = [mirna[0] for mirna in sorted_mirnas[:3]]
-                top_mirnas_string = ",\n".join(top_3_mirnas)
+            sorted_mirnas = sorted(mirna_degrees.items(), key=lambda item: item[1], reverse=True)
+            top_3_mirnas = [mirna[0] for mirna in sorted_mirnas[:3]]
+
+        if top_3_mirnas:
+            top_mirnas_string = ",\n".join(top_3_mirnas)
 
         #--- 2c. append the row to our summary list ---
         final_summary_data.append({
@@ -114,6 +137,8 @@ if __name__ == "__main__":
     parser.add_argument("--modules", required=True, help="Path to the modules definition text file.")
     parser.add_argument("--network", required=True, help="Path to the original network edge list file.")
     parser.add_argument("--output", required=True, help="Path to save the final output CSV summary table.")
+    parser.add_argument("--node_stats", default=None, help="Optional '<cancer>_Node_Stats.csv' from module_statistics.py; skips reloading the network.")
+    parser.add_argument("--weighted", action="store_true", help="Rank miRNAs by intra-module weighted degree (Intra_Strength) instead of degree.")
 
     args = parser.parse_args()
 
@@ -122,7 +147,9 @@ if __name__ == "__main__":
         ml_summary_path=args.ml_summary,
         modules_path=args.modules,
         network_path=args.network,
-        output_csv_path=args.output
+        output_csv_path=args.output,
+        node_stats_path=args.node_stats,
+        weighted=args.weighted
     )
     if exit_code != 0:
         exit(exit_code)
\ No newline at end of file
@@ -2,12 +2,22 @@
 import os
 import pandas as pd
 import numpy as np
+from scipy import sparse
 import re
 from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.metrics import silhouette_score
+from joblib import Parallel, delayed, effective_n_jobs
+from threadpoolctl import threadpool_limits
+from term_similarity import load_term_similarity, term_rows
 import argparse 
 
+CLUSTERERS = ["kmeans", "minibatch", "silhouette", "auto"]
+LARGE_MODULE_SIZE = 1000 #modules with at least this many pathways count as large in 'auto' mode
+SILHOUETTE_SAMPLE_SIZE = 2000 #caps the pairwise distance matrix built by silhouette_score
+
 def clean_term_name(term):
     if '~' in term:
         term = term.split('~', 1)[1]
@@ -15,20 +25,165 @@ def clean_term_name(term):
     term = term.replace('_', ' ').lower()
     return term
 
-def get_cluster_name(terms_in_cluster, vectorizer, feature_names):
-    cluster_text = " ".join(terms_in_cluster)
-    if not cluster_text.strip():
-        return "Unnamed Cluster"
-    tfidf_matrix = vectorizer.transform([cluster_text])
-    non_zero_indices = tfidf_matrix.toarray()[0].nonzero()[0]
-    if len(non_zero_indices) == 0:
-        return "Broadly Associated Terms"
-    sorted_indices = sorted(non_zero_indices, key=lambda i: tfidf_matrix[0, i], reverse=True)
-    top_indices = sorted_indices[:3]
-    top_words = [feature_names[i] for i in top_indices]
-    return ", ".join(word.capitalize() for word in top_words)
-
-def group_functions_with_ml(enrichment_folder: str, output_path: str):
+def fit_term_vectorizer(pathway_names):
+    """Fits the TF-IDF vocabulary used to name clusters; can be shared across modules."""
+    vectorizer = TfidfVectorizer(stop_words='english', max_df=0.9, min_df=1)
+    vectorizer.fit(pathway_names)
+    return vectorizer
+
+def get_cluster_names(pathway_names, labels, vectorizer, feature_names=None, n_top=3):
+    """
+    Names every cluster at once from its top TF-IDF words.
+
+    Term counts are summed into a cluster x vocabulary sparse matrix with a single
+    product and weighted by the fitted idf, so each cluster is scored as if its
+    terms were joined into one document. Returns a dict of cluster label -> name.
+    """
+    if feature_names is None:
+        feature_names = vectorizer.get_feature_names_out()
+    labels = np.asarray(labels)
+    cluster_ids, cluster_rows = np.unique(labels, return_inverse=True)
+    membership = sparse.csr_matrix(
+        (np.ones(len(labels)), (cluster_rows, np.arange(len(labels)))),
+        shape=(len(cluster_ids), len(labels))
+    )
+
+    #raw term counts with the fitted tokenizer and vocabulary, then idf weighting per cluster
+    counter = CountVectorizer(analyzer=vectorizer.build_analyzer(), vocabulary=vectorizer.vocabulary_)
+    term_counts = counter.transform(pathway_names)
+    cluster_scores = ((membership @ term_counts) @ sparse.diags(vectorizer.idf_)).tocsr()
+    has_text = membership @ np.array([bool(str(t).strip()) for t in pathway_names], dtype=float)
+
+    cluster_names = {}
+    for row, cluster_id in enumerate(cluster_ids):
+        if not has_text[row]:
+            cluster_names[cluster_id] = "Unnamed Cluster"
+            continue
+        start, end = cluster_scores.indptr[row], cluster_scores.indptr[row + 1]
+        data, indices = cluster_scores.data[start:end], cluster_scores.indices[start:end]
+        if len(data) == 0:
+            cluster_names[cluster_id] = "Broadly Associated Terms"
+            continue
+        if len(data) > n_top:
+            #keep everything tied with the n-th best score so ties still break by vocabulary order
+            cutoff = data[np.argpartition(-data, n_top - 1)[n_top - 1]]
+            keep = data >= cutoff
+            data, indices = data[keep], indices[keep]
+        order = np.lexsort((indices, -data))[:n_top] #highest score first, ties by vocabulary order
+        top_words = [feature_names[i] for i in indices[order]]
+        cluster_names[cluster_id] = ", ".join(word.capitalize() for word in top_words)
+    return cluster_names
+
+def load_significant_pathways(file_path):
+    pathways_df = pd.read_csv(file_path)
+
+    significant_paths = pathways_df[
+        (pathways_df['Fold_Enrichment'] > 2.0) & (pathways_df['FDR'] < 0.05)
+    ].copy()
+    
+    if np.isinf(significant_paths['Fold_Enrichment']).any():
+        max_fe = significant_paths.loc[np.isfinite(significant_paths['Fold_Enrichment']), 'Fold_Enrichment'].max()
+        if pd.isna(max_fe): max_fe = 100 # handle case where all are Inf
+        significant_paths['Fold_Enrichment'] = significant_paths['Fold_Enrichment'].replace(np.inf, max_fe * 1.5)
+
+    significant_paths['Clean_Term'] = significant_paths['Term'].apply(clean_term_name)
+    return significant_paths
+
+def embed_pathways(terms, clean_terms, library, get_model):
+    """
+    Embeddings for a module's pathways, sliced from the precomputed term similarity
+    library; only terms missing from it are encoded with the NLP model.
+    """
+    library_embeddings = library['embeddings']
+    rows = term_rows(library, terms)
+    found = rows >= 0
+    embeddings = np.zeros((len(rows), library_embeddings.shape[1]), dtype=np.float32)
+    embeddings[found] = library_embeddings[rows[found]]
+    if not found.all():
+        missing = [term for term, ok in zip(clean_terms, found) if not ok]
+        print(f"Encoding {len(missing)} pathways missing from the term similarity library...")
+        fresh = get_model().encode(missing, show_progress_bar=False)
+        norms = np.linalg.norm(fresh, axis=1, keepdims=True)
+        embeddings[~found] = fresh / np.where(norms > 0, norms, 1.0) #library embeddings are unit length
+    return embeddings
+
+def heuristic_k(num_pathways, max_k=15):
+    k = int(np.sqrt(num_pathways / 2)) #adjusted heuristic for better grouping
+    k = max(2, min(k, max_k))
+    return min(k, num_pathways) #k cannot be > num samples
+
+def search_max_k(num_pathways, max_k=15):
+    """Upper end of the silhouette search: max_k, raised to the uncapped sqrt heuristic for large modules."""
+    return max(max_k, int(np.sqrt(num_pathways / 2)))
+
+def reduce_embeddings(embeddings, n_components):
+    """Projects embeddings onto their first n_components principal components."""
+    if not n_components or n_components >= min(embeddings.shape):
+        return embeddings
+    return PCA(n_components=n_components, random_state=42).fit_transform(embeddings)
+
+def make_kmeans(k, method):
+    if method == "minibatch":
+        return MiniBatchKMeans(n_clusters=k, random_state=42, n_init='auto', batch_size=1024)
+    return KMeans(n_clusters=k, random_state=42, n_init='auto')
+
+def _score_k(embeddings, k, method):
+    labels = make_kmeans(k, method).fit_predict(embeddings)
+    sample_size = min(SILHOUETTE_SAMPLE_SIZE, len(embeddings))
+    score = silhouette_score(embeddings, labels, sample_size=sample_size, random_state=42)
+    return k, score, labels
+
+def cluster_embeddings(embeddings, method="kmeans", max_k=15, pca_components=None, n_jobs=-1):
+    """
+    Clusters pathway embeddings and returns (labels, k).
+
+    'kmeans' and 'minibatch' use the sqrt heuristic for k, capped at max_k.
+    'silhouette' fits every candidate k in parallel and keeps the best silhouette
+    score; its candidates run up to search_max_k, so large modules are not held
+    to max_k. 'auto' behaves like 'kmeans' for small modules and like a
+    PCA-reduced 'silhouette' search with MiniBatchKMeans for large ones.
+    """
+    num_pathways = len(embeddings)
+    search = method == "silhouette"
+    fit_method = method
+    if method == "auto":
+        if num_pathways >= LARGE_MODULE_SIZE:
+            search, fit_method = True, "minibatch"
+            pca_components = pca_components or 50
+        else:
+            fit_method = "kmeans"
+    elif method == "silhouette":
+        fit_method = "minibatch" if num_pathways >= LARGE_MODULE_SIZE else "kmeans"
+
+    embeddings = reduce_embeddings(embeddings, pca_components)
+
+    candidates = list(range(2, min(search_max_k(num_pathways, max_k), num_pathways - 1) + 1))
+    if not search or len(candidates) < 2:
+        k = heuristic_k(num_pathways, max_k)
+        return make_kmeans(k, fit_method).fit_predict(embeddings), k
+
+    print(f"Searching k in {candidates[0]}..{candidates[-1]} by silhouette score...")
+    #threads share the embeddings; KMeans releases the GIL. Each fit gets an equal
+    #share of the cores so concurrent fits do not each start a full OpenMP/BLAS pool.
+    workers = min(effective_n_jobs(n_jobs), len(candidates))
+    with threadpool_limits(limits=max(1, (os.cpu_count() or 1) // workers)):
+        results = Parallel(n_jobs=workers, prefer="threads")(
+            delayed(_score_k)(embeddings, k, fit_method) for k in candidates
+        )
+    k, score, labels = max(results, key=lambda r: r[1])
+    print(f"Best k = {k} (silhouette {score:.3f})")
+    return labels, k
+
+def group_functions_with_ml(
+    enrichment_folder: str,
+    output_path: str,
+    clusterer: str = "kmeans",
+    max_k: int = 15,
+    pca_components: int = None,
+    n_jobs: int = -1,
+    shared_vocabulary: bool = False,
+    term_similarity_path: str = None
+):
     print("--- step 3 (ML): automated functional grouping ---")
 
     if not os.path.isdir(enrichment_folder):
@@ -42,12 +197,38 @@ def group_functions_with_ml(enrichment_folder: str, output_path: str):
         pd.DataFrame().to_excel(output_path)
         return 0
 
-    print("Loading NLP model (this may take a moment)...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = None
+    def get_model():
+        nonlocal model
+        if model is None:
+            print("Loading NLP model (this may take a moment)...")
+            model = SentenceTransformer('all-MiniLM-L6-v2')
+        return model
+
+    library = None
+    if term_similarity_path:
+        print(f"Loading term similarity library: {term_similarity_path}")
+        library = load_term_similarity(term_similarity_path)
+        if 'embeddings' not in library:
+            print("Warning: Term similarity library has no embeddings (built with --no_embeddings); encoding pathways with the NLP model.")
+            library = None
+    if library is None:
+        get_model()
+
+    sorted_files = sorted(enrichment_files, key=lambda x: int(re.search(r'_(\d+)_', x).group(1)))
+
+    if shared_vocabulary:
+        #one vocabulary for the whole cancer so group names are comparable across modules
+        print("Fitting a shared naming vocabulary across all modules...")
+        loaded_pathways = {} #reused by the per-module pass so each file is read once
+        all_terms = []
+        for file_name in sorted_files:
+            loaded_pathways[file_name] = load_significant_pathways(os.path.join(enrichment_folder, file_name))
+            all_terms.extend(loaded_pathways[file_name]['Clean_Term'])
+        vectorizer = fit_term_vectorizer(all_terms) if all_terms else None
+        feature_names = vectorizer.get_feature_names_out() if vectorizer else None
 
     with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-        sorted_files = sorted(enrichment_files, key=lambda x: int(re.search(r'_(\d+)_', x).group(1)))
-        
         for file_name in sorted_files:
             match = re.search(r'_(\d+)_', file_name)
             if not match: continue
@@ -56,47 +237,36 @@ def group_functions_with_ml(enrichment_folder: str, output_path: str):
             module_name = f"Module {module_num}"
             print(f"--- Analyzing {module_name} with ML ---")
 
-            file_path = os.path.join(enrichment_folder, file_name)
-            pathways_df = pd.read_csv(file_path)
-
-            significant_paths = pathways_df[
-                (pathways_df['Fold_Enrichment'] > 2.0) & (pathways_df['FDR'] < 0.05)
-            ].copy()
-            
-            if np.isinf(significant_paths['Fold_Enrichment']).any():
-                max_fe = significant_paths.loc[np.isfinite(significant_paths['Fold_Enrichment']), 'Fold_Enrichment'].max()
-                if pd.isna(max_fe): max_fe = 100 # handle case where all are Inf
-                significant_paths['Fold_Enrichment'].replace(np.inf, max_fe * 1.5, inplace=True)
+            if shared_vocabulary:
+                significant_paths = loaded_pathways.pop(file_name)
+            else:
+                significant_paths = load_significant_pathways(os.path.join(enrichment_folder, file_name))
 
             if len(significant_paths) < 10: 
                 print(f"Skipping {module_name}, not enough significant pathways ({len(significant_paths)} found).")
                 pd.DataFrame().to_excel(writer, sheet_name=module_name)
                 continue
 
-            significant_paths['Clean_Term'] = significant_paths['Term'].apply(clean_term_name)
             pathway_names = significant_paths['Clean_Term'].tolist()
 
-            print(f"Generating embeddings for {len(pathway_names)} pathways...")
-            embeddings = model.encode(pathway_names, show_progress_bar=False)
+            if library is not None:
+                embeddings = embed_pathways(significant_paths['Term'].tolist(), pathway_names, library, get_model)
+            else:
+                print(f"Generating embeddings for {len(pathway_names)} pathways...")
+                embeddings = get_model().encode(pathway_names, show_progress_bar=False)
 
-            num_pathways = len(significant_paths)
-            k = int(np.sqrt(num_pathways / 2)) #adjusted heuristic for better grouping
-            k = max(2, min(k, 15)) 
-            if k > len(significant_paths): k = len(significant_paths) #k cannot be > num samples
-            
-            print(f"Clustering into {k} functional groups...")
-            kmeans = KMeans(n_clusters=k, random_state=42, n_init='auto')
-            significant_paths['Cluster'] = kmeans.fit_predict(embeddings)
+            labels, k = cluster_embeddings(
+                embeddings, method=clusterer, max_k=max_k,
+                pca_components=pca_components, n_jobs=n_jobs
+            )
+            print(f"Clustered into {k} functional groups ({clusterer}).")
+            significant_paths['Cluster'] = labels
 
             print("Generating automatic names for clusters...")
-            vectorizer = TfidfVectorizer(stop_words='english', max_df=0.9, min_df=1)
-            vectorizer.fit(pathway_names)
-            feature_names = vectorizer.get_feature_names_out()
-            
-            cluster_names = {}
-            for i in range(k):
-                terms_in_cluster = significant_paths[significant_paths['Cluster'] == i]['Clean_Term'].tolist()
-                cluster_names[i] = get_cluster_name(terms_in_cluster, vectorizer, feature_names)
+            if not shared_vocabulary:
+                vectorizer = fit_term_vectorizer(pathway_names)
+                feature_names = vectorizer.get_feature_names_out()
+            cluster_names = get_cluster_names(pathway_names, labels, vectorizer, feature_names)
 
             significant_paths['Functional_Group'] = significant_paths['Cluster'].map(cluster_names)
 
@@ -121,12 +291,24 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Group enriched pathways into functional themes using ML.")
     parser.add_argument("--enrichment", required=True, help="Path to the folder with enrichment CSV files.")
     parser.add_argument("--output", required=True, help="Full path for the output Excel summary file.")
+    parser.add_argument("--clusterer", choices=CLUSTERERS, default="kmeans", help="Clustering strategy for pathway embeddings.")
+    parser.add_argument("--max_k", type=int, default=15, help="Upper bound on the number of functional groups per module (the silhouette search extends it for large modules).")
+    parser.add_argument("--pca_components", type=int, default=None, help="Reduce embeddings to this many PCA components before clustering.")
+    parser.add_argument("--n_jobs", type=int, default=-1, help="Parallel workers for the silhouette k search (-1 = all cores).")
+    parser.add_argument("--shared_vocabulary", action="store_true", help="Fit one TF-IDF naming vocabulary across all modules.")
+    parser.add_argument("--term_similarity", default=None, help="Precomputed library from term_similarity.py; pathway embeddings are sliced from it instead of re-encoded.")
     
     args = parser.parse_args()
         
     exit_code = group_functions_with_ml(
         enrichment_folder=args.enrichment,
-        output_path=args.output
+        output_path=args.output,
+        clusterer=args.clusterer,
+        max_k=args.max_k,
+        pca_components=args.pca_components,
+        n_jobs=args.n_jobs,
+        shared_vocabulary=args.shared_vocabulary,
+        term_similarity_path=args.term_similarity
     )
     if exit_code != 0:
         exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,183 @@
+#term_similarity.py
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+SIMILARITY_KINDS = ["jaccard", "cosine"]
+
+def load_gmt_terms(gmt_folder: str):
+    """Returns (term names, list of gene lists) from every .gmt file in the folder; first occurrence of a name wins."""
+    gmt_files = sorted(f for f in os.listdir(gmt_folder) if f.endswith(".gmt"))
+    if not gmt_files:
+        raise FileNotFoundError(f"no .gmt files found in '{gmt_folder}'.")
+    pathways = {}
+    for file_name in gmt_files:
+        with open(os.path.join(gmt_folder, file_name), 'r') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 3 or fields[0] in pathways:
+                    continue
+                pathways[fields[0]] = list(dict.fromkeys(g for g in fields[2:] if g))
+    return list(pathways), list(pathways.values())
+
+def _top_k_rows(rows, cols, values, num_rows, num_cols, top_k):
+    """Keeps the top_k largest values of every row of a COO chunk (ties broken by column)."""
+    order = np.lexsort((cols, -values, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    row_start = np.searchsorted(rows, np.arange(num_rows))
+    rank = np.arange(len(rows)) - row_start[rows]
+    keep = rank < top_k
+    return sparse.csr_matrix((values[keep], (rows[keep], cols[keep])), shape=(num_rows, num_cols))
+
+def top_k_jaccard(gene_sets, top_k: int = 50, chunk_size: int = 2048):
+    """
+    Sparse term x term gene-overlap Jaccard, keeping each term's top_k neighbours.
+
+    Intersections come from chunked products of the binary term x gene matrix, so
+    only chunk_size rows of overlaps are ever materialized.
+    """
+    genes, gene_codes = {}, []
+    for gene_set in gene_sets:
+        gene_codes.append([genes.setdefault(g, len(genes)) for g in gene_set])
+    indptr = np.cumsum([0] + [len(codes) for codes in gene_codes])
+    indices = np.fromiter((c for codes in gene_codes for c in codes), dtype=np.int32, count=indptr[-1])
+    membership = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(len(gene_sets), len(genes)))
+    set_sizes = np.diff(indptr)
+    membership_t = membership.T.tocsc()
+
+    num_terms = len(gene_sets)
+    blocks = []
+    for start in range(0, num_terms, chunk_size):
+        overlap = (membership[start:start + chunk_size] @ membership_t).tocoo()
+        rows, cols, shared = overlap.row, overlap.col, overlap.data
+        off_diagonal = rows + start != cols
+        rows, cols, shared = rows[off_diagonal], cols[off_diagonal], shared[off_diagonal]
+        jaccard = shared / (set_sizes[rows + start] + set_sizes[cols] - shared)
+        blocks.append(_top_k_rows(rows, cols, jaccard, overlap.shape[0], num_terms, top_k))
+    return sparse.vstack(blocks).tocsr()
+
+def embed_terms(terms, model_name: str = 'all-MiniLM-L6-v2'):
+    """Unit-length sentence embeddings of the cleaned term names, as in ml_functional_grouping."""
+    from sentence_transformers import SentenceTransformer
+    from ml_functional_grouping import clean_term_name
+
+    print("Loading NLP model (this may take a moment)...")
+    model = SentenceTransformer(model_name)
+    embeddings = model.encode([clean_term_name(t) for t in terms], show_progress_bar=False)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms > 0, norms, 1.0)
+
+def top_k_cosine(embeddings, top_k: int = 50, chunk_size: int = 512):
+    """Sparse term x term embedding cosine, keeping each term's top_k positive neighbours."""
+    num_terms = len(embeddings)
+    top_k = min(top_k, num_terms - 1)
+    if top_k < 1:
+        return sparse.csr_matrix((num_terms, num_terms), dtype=np.float32)
+    blocks = []
+    for start in range(0, num_terms, chunk_size):
+        scores = embeddings[start:start + chunk_size] @ embeddings.T
+        chunk_rows = np.arange(len(scores))
+        scores[chunk_rows, chunk_rows + start] = -np.inf #no self-similarity
+        cols = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        values = np.take_along_axis(scores, cols, axis=1)
+        rows = np.repeat(chunk_rows, top_k)
+        cols, values = cols.ravel(), values.ravel()
+        positive = values > 0
+        blocks.append(sparse.csr_matrix(
+            (values[positive], (rows[positive], cols[positive])), shape=(len(scores), num_terms)
+        ))
+    return sparse.vstack(blocks).tocsr()
+
+def build_term_similarity(gmt_folder: str, output_path: str, top_k: int = 50, embeddings: bool = True,
+                          model_name: str = 'all-MiniLM-L6-v2'):
+    """
+    Precomputes, once for the whole pathway library, a sparse top-k term similarity
+    graph holding gene-overlap Jaccard and (optionally) embedding cosine, plus the
+    term embeddings themselves. Each matrix is symmetrized by keeping an edge when
+    either term has the other among its top_k neighbours.
+    """
+    print("--- step 3 (prep): term similarity library ---")
+    if not os.path.isdir(gmt_folder):
+        print(f"ERROR: GMT folder '{gmt_folder}' not found.")
+        return 1
+
+    terms, gene_sets = load_gmt_terms(gmt_folder)
+    print(f"Loaded {len(terms)} terms from '{gmt_folder}'.")
+
+    print(f"Computing top-{top_k} gene-overlap Jaccard neighbours...")
+    jaccard = top_k_jaccard(gene_sets, top_k)
+    arrays = {'terms': np.asarray(terms, dtype=str)}
+    matrices = {'jaccard': jaccard.maximum(jaccard.T).tocsr()}
+
+    if embeddings:
+        print("Embedding term names...")
+        term_embeddings = embed_terms(terms, model_name)
+        print(f"Computing top-{top_k} embedding cosine neighbours...")
+        cosine = top_k_cosine(term_embeddings, top_k)
+        matrices['cosine'] = cosine.maximum(cosine.T).tocsr()
+        arrays['embeddings'] = term_embeddings
+
+    for kind, matrix in matrices.items():
+        arrays[f'{kind}_data'] = matrix.data.astype(np.float32)
+        arrays[f'{kind}_indices'] = matrix.indices
+        arrays[f'{kind}_indptr'] = matrix.indptr
+        print(f"{kind}: {matrix.nnz // 2} term pairs kept")
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    np.savez_compressed(output_path, **arrays)
+    print(f"--- term similarity library saved to '{output_path}' ---")
+    return 0
+
+def load_term_similarity(library_path: str):
+    """
+    Loads a library written by build_term_similarity. Returns a dict with 'index'
+    (term -> row, a pd.Series), 'jaccard' and, when built with embeddings,
+    'cosine' (CSR matrices) and 'embeddings'.
+    """
+    with np.load(library_path) as saved:
+        terms = saved['terms']
+        library = {'index': pd.Series(np.arange(len(terms)), index=terms)}
+        for kind in SIMILARITY_KINDS:
+            if f'{kind}_data' in saved:
+                library[kind] = sparse.csr_matrix(
+                    (saved[f'{kind}_data'], saved[f'{kind}_indices'], saved[f'{kind}_indptr']),
+                    shape=(len(terms), len(terms))
+                )
+        if 'embeddings' in saved:
+            library['embeddings'] = saved['embeddings']
+    return library
+
+def term_rows(library: dict, terms):
+    """Library rows for the given terms; -1 where a term is not in the library."""
+    return library['index'].reindex(terms).fillna(-1).astype(int).values
+
+def similarity_submatrix(library: dict, rows, kind: str = "jaccard"):
+    """Slices the term x term similarity of the given library rows (all must be >= 0)."""
+    matrix = library[kind]
+    return matrix[rows][:, rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute a sparse top-k term similarity library over all GMT pathways.")
+    parser.add_argument("--gmt", required=True, help="Folder of .gmt pathway files used for enrichment.")
+    parser.add_argument("--output", required=True, help="Path for the output .npz library.")
+    parser.add_argument("--top_k", type=int, default=50, help="Neighbours kept per term in each similarity graph.")
+    parser.add_argument("--no_embeddings", action="store_true", help="Only compute gene-overlap Jaccard (skips the NLP model).")
+    parser.add_argument("--model", default='all-MiniLM-L6-v2', help="Sentence-transformers model used for term embeddings.")
+
+    args = parser.parse_args()
+
+    exit_code = build_term_similarity(
+        gmt_folder=args.gmt,
+        output_path=args.output,
+        top_k=args.top_k,
+        embeddings=not args.no_embeddings,
+        model_name=args.model
+    )
+    if exit_code != 0:
+        exit(exit_code)
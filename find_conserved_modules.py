@@ -0,0 +1,187 @@
+#find_conserved_modules.py
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+def load_all_modules(module_folder: str, node_type: str = "all"):
+    """
+    Reads every '<cancer>_Modules.txt' file and returns (module_labels, module_cancers, module_members),
+    where labels look like 'BRCA Module 3' and members are lists of node names.
+    node_type restricts membership to 'mirna' or 'gene' nodes.
+    """
+    module_labels, module_cancers, module_members = [], [], []
+    module_files = sorted(f for f in os.listdir(module_folder) if f.endswith("_Modules.txt"))
+    for file_name in module_files:
+        cancer_type = file_name.split('_')[0].upper()
+        with open(os.path.join(module_folder, file_name), 'r') as f:
+            module_lines = f.readlines()
+        for i, line in enumerate(module_lines):
+            nodes = [n for n in line.strip().split(', ') if n]
+            if node_type == "mirna":
+                nodes = [n for n in nodes if n.startswith('hsa-')]
+            elif node_type == "gene":
+                nodes = [n for n in nodes if not n.startswith('hsa-')]
+            module_labels.append(f"{cancer_type} Module {i + 1}")
+            module_cancers.append(cancer_type)
+            module_members.append(nodes)
+    return module_labels, module_cancers, module_members
+
+def build_membership_matrix(module_members):
+    """Builds a binary module x node CSR matrix plus the node vocabulary."""
+    node_index = {}
+    rows, cols = [], []
+    for row, nodes in enumerate(module_members):
+        for node in set(nodes):
+            rows.append(row)
+            cols.append(node_index.setdefault(node, len(node_index)))
+    membership = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(module_members), len(node_index))
+    )
+    node_names = np.empty(len(node_index), dtype=object)
+    for node, col in node_index.items():
+        node_names[col] = node
+    return membership, node_names
+
+def module_similarity_edges(membership, module_cancers, min_jaccard: float = 0.3, min_shared: int = 3):
+    """
+    Computes the Jaccard index for every pair of modules that share at least one node.
+
+    The intersection counts come from one sparse product (membership @ membership.T);
+    since a node sits in at most one module per cancer, the product only touches
+    pairs that actually overlap, so cost grows with total membership rather than
+    with the square of the number of modules. Pairs from the same cancer are dropped.
+    """
+    sizes = np.asarray(membership.sum(axis=1)).ravel()
+    intersections = sparse.triu(membership @ membership.T, k=1).tocoo()
+
+    rows, cols, shared = intersections.row, intersections.col, intersections.data
+    jaccard = shared / (sizes[rows] + sizes[cols] - shared)
+
+    module_cancers = np.asarray(module_cancers)
+    keep = (
+        (module_cancers[rows] != module_cancers[cols])
+        & (shared >= min_shared)
+        & (jaccard >= min_jaccard)
+    )
+    return rows[keep], cols[keep], shared[keep], jaccard[keep]
+
+def find_conserved_modules(
+    module_folder: str,
+    output_excel_path: str,
+    min_jaccard: float = 0.3,
+    min_shared: int = 3,
+    min_cancers: int = 3,
+    node_type: str = "all"
+):
+    """
+    Compares module memberships across all cancers, writes the cross-cancer module
+    similarity graph and groups highly overlapping modules into conserved clusters.
+    """
+    print("\n=========================================================")
+    print("  FINDING CONSERVED MODULES ACROSS CANCERS")
+    print("=========================================================\n")
+
+    if not os.path.isdir(module_folder):
+        print(f"ERROR: Module folder not found at '{module_folder}'")
+        return 1
+
+    module_labels, module_cancers, module_members = load_all_modules(module_folder, node_type)
+    if not module_labels:
+        print(f"ERROR: No '*_Modules.txt' files found in '{module_folder}'.")
+        return 1
+    print(f"Loaded {len(module_labels)} modules from {len(set(module_cancers))} cancer types.")
+
+    # --- 1. sparse module x node membership and pairwise overlaps ---
+    membership, node_names = build_membership_matrix(module_members)
+    print(f"Membership matrix: {membership.shape[0]} modules x {membership.shape[1]} nodes.")
+
+    rows, cols, shared, jaccard = module_similarity_edges(membership, module_cancers, min_jaccard, min_shared)
+    print(f"Found {len(rows)} cross-cancer module pairs with Jaccard >= {min_jaccard}.")
+
+    module_labels = np.asarray(module_labels, dtype=object)
+    module_cancers = np.asarray(module_cancers, dtype=object)
+    sizes = np.asarray(membership.sum(axis=1)).ravel()
+
+    similarity_df = pd.DataFrame({
+        "Module_A": module_labels[rows],
+        "Module_B": module_labels[cols],
+        "Size_A": sizes[rows],
+        "Size_B": sizes[cols],
+        "Shared_Nodes": shared,
+        "Jaccard": jaccard.round(4)
+    }).sort_values(by="Jaccard", ascending=False)
+
+    # --- 2. conserved clusters = connected components of the similarity graph ---
+    n_modules = len(module_labels)
+    graph = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_modules, n_modules))
+    _, component = connected_components(graph, directed=False)
+
+    conserved_data = []
+    for comp_id in np.unique(component):
+        members = np.flatnonzero(component == comp_id)
+        cancers = sorted(set(module_cancers[members]))
+        if len(members) < 2 or len(cancers) < min_cancers:
+            continue
+        #core nodes = present in at least half of the modules in the cluster
+        node_counts = np.asarray(membership[members].sum(axis=0)).ravel()
+        core = np.flatnonzero(node_counts >= max(2, len(members) / 2))
+        core = core[np.argsort(-node_counts[core], kind='stable')]
+        core_nodes = node_names[core]
+        conserved_data.append({
+            "Cancer_Count": len(cancers),
+            "Module_Count": len(members),
+            "Present_In_Cancers": ", ".join(cancers),
+            "Modules": ", ".join(module_labels[members]),
+            "Core_miRNAs": ", ".join(n for n in core_nodes if n.startswith('hsa-')),
+            "Core_Genes": ", ".join(n for n in core_nodes if not n.startswith('hsa-'))
+        })
+
+    conserved_df = pd.DataFrame(
+        conserved_data,
+        columns=["Cancer_Count", "Module_Count", "Present_In_Cancers", "Modules", "Core_miRNAs", "Core_Genes"]
+    ).sort_values(by=["Cancer_Count", "Module_Count"], ascending=False)
+    conserved_df.insert(0, "Conserved_Cluster", range(1, len(conserved_df) + 1))
+    print(f"Identified {len(conserved_df)} conserved module clusters spanning >= {min_cancers} cancers.")
+
+    # --- 3. save the similarity graph and clusters ---
+    output_dir = os.path.dirname(output_excel_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    print(f"Saving conserved module summary to: {output_excel_path}")
+    with pd.ExcelWriter(output_excel_path, engine='xlsxwriter') as writer:
+        conserved_df.to_excel(writer, sheet_name="Conserved_Module_Clusters", index=False)
+        similarity_df.to_excel(writer, sheet_name="Module_Similarity_Graph", index=False)
+        writer.sheets["Conserved_Module_Clusters"].set_column('B:D', 20)
+        writer.sheets["Conserved_Module_Clusters"].set_column('E:G', 80)
+        writer.sheets["Module_Similarity_Graph"].set_column('A:B', 25)
+        writer.sheets["Module_Similarity_Graph"].set_column('C:F', 15)
+
+    print("--- conserved module search complete ---")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find modules conserved across cancers by shared gene/miRNA membership.")
+    parser.add_argument("--modules", default=r"02_Module_Discovery", help="Folder containing the '<cancer>_Modules.txt' files.")
+    parser.add_argument("--output", default=os.path.join(r"05_Pan_Cancer_Analysis", "Pan_Cancer_Conserved_Modules.xlsx"), help="Path for the output Excel file.")
+    parser.add_argument("--min_jaccard", type=float, default=0.3, help="Minimum Jaccard index for two modules to be linked.")
+    parser.add_argument("--min_shared", type=int, default=3, help="Minimum number of shared nodes for two modules to be linked.")
+    parser.add_argument("--min_cancers", type=int, default=3, help="Minimum number of cancers a conserved cluster must span.")
+    parser.add_argument("--node_type", choices=["all", "mirna", "gene"], default="all", help="Which nodes to compare modules on.")
+
+    args = parser.parse_args()
+
+    exit_code = find_conserved_modules(
+        module_folder=args.modules,
+        output_excel_path=args.output,
+        min_jaccard=args.min_jaccard,
+        min_shared=args.min_shared,
+        min_cancers=args.min_cancers,
+        node_type=args.node_type
+    )
+    if exit_code != 0:
+        exit(exit_code)
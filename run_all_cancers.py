@@ -1,8 +1,12 @@
 #run_all_cancers.py
 import os
+import sys
+import asyncio
+import argparse
+import socket
 import subprocess
-import pandas as pd
-from collections import defaultdict
+import work_queue
+import synthesize_pan_cancer
 
 CANCER_TYPES = [
     "acc", "blca", "brca", "cesc", "coad", "esca", "hnsc", "kich",
@@ -13,9 +17,12 @@ CANCER_TYPES = [
 ]
 
 PATH_FIND_MODULES = r"02_Module_Discovery/find_modules.py"
+PATH_MODULE_STATS = r"02_Module_Discovery/module_statistics.py"
 PATH_RUN_ENRICHMENT = r"03_Pathway_Enrichment/run_enrichment.R"
+PATH_BATCH_ENRICHMENT = r"03_Pathway_Enrichment/batch_enrichment.py"
 PATH_ML_GROUPING = r"04_Functional_Analysis/ml_functional_grouping.py"
 PATH_CREATE_SUMMARY = r"04_Functional_Analysis/create_final_summary.py"
+PATH_TERM_SIMILARITY = r"04_Functional_Analysis/Term_Similarity.npz" #optional, built once with term_similarity.py
 
 NETWORK_INPUT_PATH = r"NetworkEdgelists"
 BASE_INPUT_PATH = r"01_Input_Data"
@@ -23,140 +30,383 @@ BASE_MODULE_PATH = r"02_Module_Discovery"
 BASE_ENRICHMENT_PATH = r"03_Pathway_Enrichment"
 BASE_ANALYSIS_PATH = r"04_Functional_Analysis"
 PAN_CANCER_OUTPUT_FOLDER = r"05_Pan_Cancer_Analysis" #new folder for final results
+PAN_CANCER_SUMMARY_FILE = os.path.join(PAN_CANCER_OUTPUT_FOLDER, "Pan_Cancer_miRNA_Function_Summary.xlsx")
+LOG_FOLDER = r"logs" #per-cancer step logs
+STREAM_CHUNK_SIZE = 65536 #bytes read from a step's pipe at a time
 
-def run_command(command):
-    """Helper function to run a command line process and check for errors."""
-    print(f"\n>>> EXECUTING: {command}")
-    try:
-        subprocess.run(command, check=True, shell=True, capture_output=True, text=True)
-        print(f">>> SUCCESS: Finished '{command.split()[0]}'")
-    except subprocess.CalledProcessError as e:
-        print(f"!!! ERROR: Command failed with exit code {e.returncode}")
-        print(f"!!! FAILED COMMAND: {command}")
-        print(f"--- STDOUT ---\n{e.stdout}")
-        print(f"--- STDERR ---\n{e.stderr}")
-        raise  #stop the pipeline if any step fails
-
-def synthesize_pan_cancer_results():
+def _write_log_line(raw_line: bytes, log_file, label: str, echo: bool):
+    line = raw_line.decode(errors='replace').rstrip()
+    log_file.write(line + "\n")
+    log_file.flush()
+    if echo:
+        print(f"[{label}] {line}", flush=True)
+
+async def _stream_to_log(stream, log_file, label: str, echo: bool):
     """
-    Reads all the final summary tables and identifies conserved and
-    cancer-specific miRNA-function relationships.
+    Copies a subprocess pipe to the task log line by line as it is produced.
+    The pipe is read in fixed-size chunks rather than with readline, so a line
+    longer than the stream buffer limit cannot make the read fail.
     """
-    print("\n=========================================================")
-    print("  STARTING PAN-CANCER SYNTHESIS")
-    print("=========================================================\n")
+    partial = [] #pieces of a line that has not ended yet
+    while True:
+        chunk = await stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        pieces = chunk.split(b"\n")
+        if len(pieces) == 1:
+            partial.append(chunk)
+            continue
+        _write_log_line(b"".join(partial) + pieces[0], log_file, label, echo)
+        for raw_line in pieces[1:-1]:
+            _write_log_line(raw_line, log_file, label, echo)
+        partial = [pieces[-1]] if pieces[-1] else []
+    if partial:
+        _write_log_line(b"".join(partial), log_file, label, echo)
 
-    summary_files = [os.path.join(BASE_ANALYSIS_PATH, f) for f in os.listdir(BASE_ANALYSIS_PATH) if f.endswith("_Final_Paper_Table.csv")]
+async def run_command_async(args: list, log_path: str, label: str, timeout: float = None, echo: bool = True):
+    """
+    Runs one pipeline step without a shell, streaming stdout/stderr into log_path
+    (and the console when echo is set) instead of buffering it until exit.
+    The process is killed whenever the step ends abnormally (timeout, cancelled
+    sweep, or an error while reading its output).
+    """
+    print(f"\n>>> EXECUTING [{label}]: {' '.join(args)}", flush=True)
+    with open(log_path, 'a') as log_file:
+        log_file.write(f"\n>>> {' '.join(args)}\n")
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            env={**os.environ, "PYTHONUNBUFFERED": "1"} #python steps flush each line so logs stay live
+        )
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    _stream_to_log(process.stdout, log_file, label, echo),
+                    _stream_to_log(process.stderr, log_file, label, echo),
+                    process.wait()
+                ),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"!!! ERROR [{label}]: timed out after {timeout} seconds (log: {log_path})")
+            raise
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    if process.returncode != 0:
+        print(f"!!! ERROR [{label}]: Command failed with exit code {process.returncode}")
+        print(f"!!! FAILED COMMAND: {' '.join(args)}")
+        print(f"!!! See log: {log_path}")
+        raise subprocess.CalledProcessError(process.returncode, args)
+    print(f">>> SUCCESS [{label}]", flush=True)
+
+def build_pipeline_steps(cancer_type: str, project_root: str, weighted: bool = False):
+    """
+    Returns the ordered (step_name, argv) list for one cancer type, or None
+    when its edge list is missing. weighted marks the edge list as
+    (miRNA, gene, weight) for discovery, statistics and miRNA ranking.
+    ML grouping reuses the precomputed term similarity library when it exists.
+    """
+    #helper function to create absolute paths
+    def to_abs_path(rel_path):
+        return os.path.abspath(os.path.join(project_root, rel_path)).replace('\\', '/')
+
+    edge_list_file = to_abs_path(f"{NETWORK_INPUT_PATH}/{cancer_type}_EdgeList2.txt")
+    gmt_folder = to_abs_path(f"{BASE_INPUT_PATH}/pathway_gmt_files")
     
-    #dictionaries to aggregate data across all cancers
-    function_counts = defaultdict(int)
-    function_to_mirnas = defaultdict(lambda: defaultdict(list))
-
-    #read and aggregate data from each cancer's summary table
-    for f_path in summary_files:
-        cancer_type = os.path.basename(f_path).split('_')[0]
-        df = pd.read_csv(f_path)
-        for _, row in df.iterrows():
-            #handle cases where functions might be "N/A" or "Not Significant"
-            if pd.isna(row['Functions']) or "Significant" in row['Functions']:
-                continue
-            
-            functions = [func.strip() for func in row['Functions'].split('+')]
-            mirnas = [mirna.strip() for mirna in row['Top 3 miRNAs'].split(',\n')]
-            
-            for func in functions:
-                function_counts[func] += 1
-                function_to_mirnas[func][cancer_type] = mirnas
-
-    #--- create pan cancer conserved functions tabl
-    conserved_df = pd.DataFrame.from_dict(function_counts, orient='index', columns=['Cancer_Count'])
-    conserved_df = conserved_df.sort_values(by='Cancer_Count', ascending=False).reset_index()
-    conserved_df = conserved_df.rename(columns={'index': 'Functional_Group'})
+    modules_file = to_abs_path(f"{BASE_MODULE_PATH}/{cancer_type}_Modules.txt")
+    module_stats_prefix = to_abs_path(f"{BASE_MODULE_PATH}/{cancer_type}")
+    node_stats_file = f"{module_stats_prefix}_Node_Stats.csv"
+    enrichment_folder = to_abs_path(f"{BASE_ENRICHMENT_PATH}/Enrichment_Results_{cancer_type}")
     
-    #filter for functions present in at least 5 cancers (example threshold)
-    conserved_df_filtered = conserved_df[conserved_df['Cancer_Count'] >= 5]
-    print("--- Top Conserved Pan-Cancer Functions ---")
-    print(conserved_df_filtered.head(10))
-
-    #--- create cancer-specific functions table ---
-    specific_df = conserved_df[conserved_df['Cancer_Count'] == 1]
-    #add the miRNA drivers for these specific functions
-    specific_df['Cancer_Type'] = specific_df['Functional_Group'].apply(
-        lambda func: list(function_to_mirnas[func].keys())[0]
-    )
-    specific_df['Top_3_miRNAs'] = specific_df['Functional_Group'].apply(
-        lambda func: ", ".join(list(function_to_mirnas[func].values())[0])
-    )
-    print("\n--- Top Cancer-Specific Functions ---")
-    print(specific_df.head(10))
+    ml_summary_folder = to_abs_path(f"{BASE_ANALYSIS_PATH}/Functional_Summary_ML_{cancer_type}")
+    ml_summary_file = to_abs_path(f"{ml_summary_folder}/{cancer_type}_Functions_Summary_ML.xlsx")
+    final_table_file = to_abs_path(f"{BASE_ANALYSIS_PATH}/{cancer_type}_Final_Paper_Table.csv")
     
-    # --- save synthesis results to single .xlsx file ---
-    # output_excel_path = os.path.join(PAN_CANCER_OUTPUT_FOLDER, "Pan_Cancer_Summary.xlsx")
-    # with pd.ExcelWriter(output_excel_path, engine='xlsxwriter') as writer:
-    #     conserved_df.to_excel(writer, sheet_name="Conserved_Functions", index=False)
-    #     specific_df.to_excel(writer, sheet_name="Cancer_Specific_Functions", index=False)
+    #create output directories
+    os.makedirs(enrichment_folder.replace(project_root.replace('\\','/') + '/', ''), exist_ok=True)
+    os.makedirs(ml_summary_folder.replace(project_root.replace('\\','/') + '/', ''), exist_ok=True)
     
-    print(f"\n>>> Pan-cancer synthesis complete. Results saved to '{output_excel_path}'")
+    if not os.path.exists(edge_list_file):
+        print(f"!!! WARNING: Edge list for {cancer_type} not found at {edge_list_file}. Skipping this cancer type.")
+        return None
 
-def main():
+    python = sys.executable
+    weight_flag = ["--weighted"] if weighted else []
+    term_similarity_file = to_abs_path(PATH_TERM_SIMILARITY)
+    library_flag = ["--term_similarity", term_similarity_file] if os.path.exists(term_similarity_file) else []
+    return [
+        #step 1: find_modules.py
+        ("find_modules", [python, PATH_FIND_MODULES, "--edgelist", edge_list_file, "--output", modules_file, *weight_flag]),
+        #step 1b: module_statistics.py (computed once, reused by later steps)
+        ("module_statistics", [python, PATH_MODULE_STATS, "--edgelist", edge_list_file, "--modules", modules_file, "--output_prefix", module_stats_prefix, *weight_flag]),
+        #step 2: run_enrichment.R
+        ("run_enrichment", ["Rscript", PATH_RUN_ENRICHMENT, "--modules", modules_file, "--gmt", gmt_folder, "--output", enrichment_folder]),
+        #step 3: ml_functional_grouping.py
+        ("ml_grouping", [python, PATH_ML_GROUPING, "--enrichment", enrichment_folder, "--output", ml_summary_file, *library_flag]),
+        #step 4: create_final_summary.py
+        ("create_summary", [python, PATH_CREATE_SUMMARY, "--ml_summary", ml_summary_file, "--modules", modules_file, "--network", edge_list_file, "--node_stats", node_stats_file, "--output", final_table_file, *weight_flag]),
+    ]
+
+async def run_cancer_pipeline(cancer_type: str, steps: list, semaphore: asyncio.Semaphore, progress: dict, timeout: float, echo: bool, fresh_log: bool = True):
+    """Runs one cancer's steps in order while holding one of the concurrency slots."""
+    async with semaphore:
+        print(f"\n---------------------------------------------------------")
+        print(f"  STARTING ANALYSIS FOR CANCER TYPE: {cancer_type.upper()}")
+        print(f"---------------------------------------------------------\n")
+        log_path = os.path.join(LOG_FOLDER, f"{cancer_type}_pipeline.log")
+        if fresh_log:
+            open(log_path, 'w').close() #start a fresh log for this run
+
+        for step_name, args in steps:
+            label = f"{cancer_type} {step_name}"
+            await run_command_async(args, log_path, label, timeout=timeout, echo=echo)
+
+        if progress is not None:
+            progress['done'] += 1
+            print(f"\n--- COMPLETED ANALYSIS FOR {cancer_type.upper()} ({progress['done']}/{progress['total']} cancers done) ---")
+
+async def run_sweep(pipelines: dict, max_parallel: int, timeout: float, echo: bool, progress: dict = None, fresh_log: bool = True):
+    """
+    Runs every cancer's steps with at most max_parallel cancers running at once.
+    The first failure (or Ctrl-C) cancels the whole sweep and kills running steps.
+    """
+    semaphore = asyncio.Semaphore(max_parallel)
+    tasks = [
+        asyncio.create_task(run_cancer_pipeline(cancer_type, steps, semaphore, progress, timeout, echo, fresh_log))
+        for cancer_type, steps in pipelines.items()
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def run_all_pipelines(cancer_types: list, project_root: str, max_parallel: int, timeout: float, echo: bool,
+                            batch_enrichment: bool = False, weighted: bool = False, universe_path: str = None):
+    """
+    Runs the pipeline for all cancer types. With batch_enrichment, module discovery
+    runs for every cancer first, then one batch_enrichment.py call replaces the
+    per-cancer run_enrichment.R step, then the remaining steps run per cancer.
+    universe_path is the gene universe file the batch step tests against.
+    """
+    pipelines = {}
+    for cancer_type in cancer_types:
+        steps = build_pipeline_steps(cancer_type, project_root, weighted)
+        if steps is not None:
+            pipelines[cancer_type] = steps
+    progress = {'done': 0, 'total': len(pipelines)}
+
+    if not batch_enrichment:
+        await run_sweep(pipelines, max_parallel, timeout, echo, progress)
+        return
+
+    step_names = [name for name, _ in next(iter(pipelines.values()), [])]
+    if not step_names:
+        return
+    split = step_names.index("run_enrichment")
+    await run_sweep({c: steps[:split] for c, steps in pipelines.items()}, max_parallel, timeout, echo)
+
+    #step 2 (batch): one sparse enrichment pass over every module of every cancer
+    def to_abs_path(rel_path):
+        return os.path.abspath(os.path.join(project_root, rel_path)).replace('\\', '/')
+
+    batch_args = [
+        sys.executable, PATH_BATCH_ENRICHMENT,
+        "--modules", to_abs_path(BASE_MODULE_PATH),
+        "--gmt", to_abs_path(f"{BASE_INPUT_PATH}/pathway_gmt_files"),
+        "--output", to_abs_path(BASE_ENRICHMENT_PATH),
+        "--universe", os.path.abspath(universe_path),
+        "--cancers", *pipelines
+    ]
+    batch_log = os.path.join(LOG_FOLDER, "batch_enrichment.log")
+    open(batch_log, 'w').close()
+    await run_command_async(batch_args, batch_log, "batch_enrichment", timeout=timeout, echo=echo)
+
+    await run_sweep({c: steps[split + 1:] for c, steps in pipelines.items()}, max_parallel, timeout, echo, progress, fresh_log=False)
+
+def parse_shard(shard: str):
+    """Parses 'i/N' (0 <= i < N) into (i, N)."""
+    try:
+        index, count = (int(part) for part in shard.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"--shard must look like 'i/N', got '{shard}'")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"--shard index must satisfy 0 <= i < N, got '{shard}'")
+    return index, count
+
+def shard_cancer_types(cancer_types: list, shard_index: int, shard_count: int):
+    """Static round-robin partition; the same (i, N) always yields the same cancers."""
+    return sorted(cancer_types)[shard_index::shard_count]
+
+async def run_queue_worker(queue_path: str, worker_id: str, project_root: str, max_parallel: int,
+                           timeout: float, echo: bool, lease_seconds: float, max_attempts: int, weighted: bool = False):
+    """
+    Claims cancer types from the shared SQLite queue until none are left, renewing
+    each lease with a heartbeat while its pipeline runs. Workers that run out of
+    work keep polling so they can pick up tasks whose worker died (expired lease).
+    Returns True if this worker should run the final synthesis.
+    """
+    async def heartbeat(cancer_type, pipeline_task):
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            still_held = await asyncio.to_thread(work_queue.renew_lease, queue_path, cancer_type, worker_id, lease_seconds)
+            if not still_held:
+                print(f"!!! WARNING [{worker_id}]: lost the lease on {cancer_type}; stopping it.")
+                pipeline_task.cancel()
+                return
+
+    async def slot():
+        while True:
+            cancer_type = await asyncio.to_thread(work_queue.claim_task, queue_path, worker_id, lease_seconds, max_attempts)
+            if cancer_type is None:
+                summary = await asyncio.to_thread(work_queue.queue_summary, queue_path)
+                if not summary.get('pending') and not summary.get('running'):
+                    return
+                await asyncio.sleep(lease_seconds / 3) #others are still running; wait for expired leases
+                continue
+
+            steps = build_pipeline_steps(cancer_type, project_root, weighted)
+            if steps is None:
+                await asyncio.to_thread(work_queue.finish_task, queue_path, cancer_type, worker_id, True, max_attempts)
+                continue
+
+            pipeline_task = asyncio.create_task(
+                run_cancer_pipeline(cancer_type, steps, asyncio.Semaphore(1), None, timeout, echo) #the slots already cap concurrency
+            )
+            beat = asyncio.create_task(heartbeat(cancer_type, pipeline_task))
+            succeeded = False
+            try:
+                await pipeline_task
+                succeeded = True
+            except Exception as e: #any step failure counts against this task, not the worker
+                print(f"!!! ERROR [{worker_id}]: {cancer_type} failed ({type(e).__name__}: {e}); returning it to the queue.")
+            except asyncio.CancelledError:
+                if not beat.done(): #cancelled from outside (Ctrl-C), not by a lost lease
+                    raise
+            finally:
+                beat.cancel()
+            counted = await asyncio.to_thread(work_queue.finish_task, queue_path, cancer_type, worker_id, succeeded, max_attempts)
+            if not counted:
+                print(f"!!! WARNING [{worker_id}]: no longer held {cancer_type} when it finished; its result was not recorded.")
+            summary = await asyncio.to_thread(work_queue.queue_summary, queue_path)
+            print(f">>> [{worker_id}] {cancer_type}: {'done' if succeeded else 'not done'}; queue status {summary}")
+
+    await asyncio.gather(*(slot() for _ in range(max_parallel)))
+    return await asyncio.to_thread(work_queue.claim_synthesis, queue_path, worker_id)
+
+async def run_local_workers(num_workers: int, queue_path: str, extra_args: list):
+    """Local stand-in for a cluster: starts num_workers worker processes on this host."""
+    processes = []
+    for k in range(num_workers):
+        args = [sys.executable, os.path.abspath(__file__), "--queue", queue_path, "--worker_id", f"{socket.gethostname()}-local{k}", *extra_args]
+        print(f">>> Starting local worker {k}: {' '.join(args)}")
+        processes.append(await asyncio.create_subprocess_exec(*args))
+    try:
+        return_codes = await asyncio.gather(*(p.wait() for p in processes))
+    except asyncio.CancelledError:
+        for p in processes:
+            if p.returncode is None:
+                p.kill()
+        raise
+    return max(return_codes, default=0)
+
+def main(max_parallel: int = 1, timeout: float = None, echo: bool = True, batch_enrichment: bool = False,
+         shard: tuple = None, queue_path: str = None, worker_id: str = None,
+         lease_seconds: float = 300, max_attempts: int = 3, weighted: bool = False, universe_path: str = None):
     """
     Main function to run the entire miRNA analysis pipeline
     for each specified cancer type.
+
+    shard=(i, N) runs only this node's static share of the cancers and leaves the
+    synthesis to a separate run once every shard has finished. queue_path instead
+    makes this process a worker on a shared SQLite queue; the worker that sees the
+    last task finish runs the synthesis over the merged outputs.
     """
     #create the final output folder if it doesn't exist
     os.makedirs(PAN_CANCER_OUTPUT_FOLDER, exist_ok=True)
+    os.makedirs(LOG_FOLDER, exist_ok=True)
     
     #get the absolute path of the project's root directory
     project_root = os.path.abspath(os.path.dirname(__file__))
 
-    for cancer_type in CANCER_TYPES:
-        print(f"\n---------------------------------------------------------")
-        print(f"  STARTING ANALYSIS FOR CANCER TYPE: {cancer_type.upper()}")
-        print(f"---------------------------------------------------------\n")
-        
-        #helper function to create absolute paths
-        def to_abs_path(rel_path):
-            return os.path.abspath(os.path.join(project_root, rel_path)).replace('\\', '/')
-
-        edge_list_file = to_abs_path(f"{NETWORK_INPUT_PATH}/{cancer_type}_EdgeList2.txt")
-        gmt_folder = to_abs_path(f"{BASE_INPUT_PATH}/pathway_gmt_files")
-        
-        modules_file = to_abs_path(f"{BASE_MODULE_PATH}/{cancer_type}_Modules.txt")
-        enrichment_folder = to_abs_path(f"{BASE_ENRICHMENT_PATH}/Enrichment_Results_{cancer_type}")
-        
-        ml_summary_folder = to_abs_path(f"{BASE_ANALYSIS_PATH}/Functional_Summary_ML_{cancer_type}")
-        ml_summary_file = to_abs_path(f"{ml_summary_folder}/{cancer_type}_Functions_Summary_ML.xlsx")
-        final_table_file = to_abs_path(f"{BASE_ANALYSIS_PATH}/{cancer_type}_Final_Paper_Table.csv")
-        
-        #create output directories
-        os.makedirs(enrichment_folder.replace(project_root.replace('\\','/') + '/', ''), exist_ok=True)
-        os.makedirs(ml_summary_folder.replace(project_root.replace('\\','/') + '/', ''), exist_ok=True)
-        
-        #--- execute the pipeline steps in order ---
-        if not os.path.exists(edge_list_file):
-            print(f"!!! WARNING: Edge list for {cancer_type} not found at {edge_list_file}. Skipping this cancer type.")
-            continue
-
-        #step 1: find_modules.py
-        cmd_find_modules = f"python {PATH_FIND_MODULES} --edgelist \"{edge_list_file}\" --output \"{modules_file}\""
-        run_command(cmd_find_modules)
+    if queue_path:
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        work_queue.init_queue(queue_path, CANCER_TYPES)
+        print(f">>> Worker {worker_id} joining queue '{queue_path}'")
+        run_synthesis = asyncio.run(run_queue_worker(
+            queue_path, worker_id, project_root, max_parallel, timeout, echo, lease_seconds, max_attempts, weighted
+        ))
+        summary = work_queue.queue_summary(queue_path)
+        print(f">>> Worker {worker_id} finished. Queue status: {summary}")
+        if run_synthesis:
+            if summary.get('failed'):
+                print(f"!!! WARNING: {summary['failed']} cancer types failed; synthesizing the ones that finished.")
+            synthesize_pan_cancer.synthesize_pan_cancer_results(BASE_ANALYSIS_PATH, PAN_CANCER_SUMMARY_FILE)
+        return
 
-        #step 2: run_enrichment.R
-        cmd_run_enrichment = f"Rscript {PATH_RUN_ENRICHMENT} --modules \"{modules_file}\" --gmt \"{gmt_folder}\" --output \"{enrichment_folder}\""
-        run_command(cmd_run_enrichment)
+    cancer_types = CANCER_TYPES
+    if shard is not None:
+        cancer_types = shard_cancer_types(CANCER_TYPES, *shard)
+        print(f">>> Shard {shard[0]}/{shard[1]}: {', '.join(cancer_types)}")
 
-        #step 3: ml_functional_grouping.py
-        cmd_ml_grouping = f"python {PATH_ML_GROUPING} --enrichment \"{enrichment_folder}\" --output \"{ml_summary_file}\""
-        run_command(cmd_ml_grouping)
-        
-        #step 4: create_final_summary.py
-        cmd_create_summary = f"python {PATH_CREATE_SUMMARY} --ml_summary \"{ml_summary_file}\" --modules \"{modules_file}\" --network \"{edge_list_file}\" --output \"{final_table_file}\""
-        run_command(cmd_create_summary)
+    asyncio.run(run_all_pipelines(cancer_types, project_root, max_parallel, timeout, echo, batch_enrichment, weighted, universe_path))
 
-        print(f"\n--- COMPLETED ANALYSIS FOR {cancer_type.upper()} ---")
+    if shard is not None and shard[1] > 1:
+        print(">>> Shard complete. Run synthesize_pan_cancer.py once all shards have finished.")
+        return
 
     #run final synthesis after all cancers are processed
-    synthesize_pan_cancer_results()
+    synthesize_pan_cancer.synthesize_pan_cancer_results(BASE_ANALYSIS_PATH, PAN_CANCER_SUMMARY_FILE)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the miRNA module pipeline for every cancer type.")
+    parser.add_argument("--max_parallel", type=int, default=1, help="Number of cancer types processed concurrently.")
+    parser.add_argument("--timeout", type=float, default=None, help="Per-step timeout in seconds (default: no timeout).")
+    parser.add_argument("--quiet", action="store_true", help="Only write step output to the log files, not the console.")
+    parser.add_argument("--batch_enrichment", action="store_true", help="Run enrichment for all cancers in one sparse batch instead of per-cancer Rscript calls.")
+    parser.add_argument("--shard", type=parse_shard, default=None, help="Run only static shard 'i/N' of the cancer types (0 <= i < N).")
+    parser.add_argument("--queue", default=None, help="Path to a shared SQLite work queue; this process claims cancers from it as a worker.")
+    parser.add_argument("--worker_id", default=None, help="Worker name recorded in the queue (default: hostname-pid).")
+    parser.add_argument("--lease_seconds", type=float, default=300, help="Queue lease length; a worker heartbeats every third of it.")
+    parser.add_argument("--max_attempts", type=int, default=3, help="Times a cancer type is tried before it is marked failed.")
+    parser.add_argument("--weighted", action="store_true", help="Edge lists are (miRNA, gene, weight); weights drive module discovery and miRNA ranking.")
+    parser.add_argument("--universe", default=None, help="Gene universe file for --batch_enrichment (one protein-coding Entrez ID per line, as used by run_enrichment.R).")
+    parser.add_argument("--local_workers", type=int, default=0, help="Start this many local queue workers (requires --queue).")
+
+    args = parser.parse_args()
+
+    if args.queue and (args.shard or args.batch_enrichment):
+        parser.error("--queue cannot be combined with --shard or --batch_enrichment")
+    if args.batch_enrichment and not args.universe:
+        parser.error("--batch_enrichment requires --universe so the statistics match run_enrichment.R")
+    if args.universe and not os.path.exists(args.universe):
+        parser.error(f"universe file '{args.universe}' not found")
+    if args.local_workers and not args.queue:
+        parser.error("--local_workers requires --queue")
+
+    if args.local_workers:
+        passthrough = ["--max_parallel", str(args.max_parallel), "--lease_seconds", str(args.lease_seconds), "--max_attempts", str(args.max_attempts)]
+        if args.timeout is not None:
+            passthrough += ["--timeout", str(args.timeout)]
+        if args.quiet:
+            passthrough.append("--quiet")
+        if args.weighted:
+            passthrough.append("--weighted")
+        exit(asyncio.run(run_local_workers(args.local_workers, args.queue, passthrough)))
+
+    main(
+        max_parallel=args.max_parallel,
+        timeout=args.timeout,
+        echo=not args.quiet,
+        batch_enrichment=args.batch_enrichment,
+        shard=args.shard,
+        queue_path=args.queue,
+        worker_id=args.worker_id,
+        lease_seconds=args.lease_seconds,
+        max_attempts=args.max_attempts,
+        weighted=args.weighted,
+        universe_path=args.universe
+    )
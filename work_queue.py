@@ -0,0 +1,133 @@
+#work_queue.py
+import os
+import time
+import sqlite3
+
+#task states: pending -> running -> done | failed; an expired running lease counts as pending again
+
+def _connect(queue_path: str):
+    conn = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 60000")
+    return conn
+
+def init_queue(queue_path: str, cancer_types: list):
+    """Creates the queue database (if needed) and adds any cancer types not queued yet."""
+    queue_dir = os.path.dirname(queue_path)
+    if queue_dir:
+        os.makedirs(queue_dir, exist_ok=True)
+    conn = _connect(queue_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                cancer_type TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker_id TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated REAL
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO tasks (cancer_type, updated) VALUES (?, ?)",
+            [(cancer_type, time.time()) for cancer_type in cancer_types]
+        )
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+def claim_task(queue_path: str, worker_id: str, lease_seconds: float, max_attempts: int = 3):
+    """
+    Atomically claims the next pending cancer type (or one whose lease has expired)
+    for worker_id. Returns the cancer type, or None when nothing is claimable.
+    """
+    now = time.time()
+    conn = _connect(queue_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE") #takes the write lock so two workers cannot claim the same row
+        #an expired lease on a task that has used all its attempts is a failure, not a retry
+        conn.execute("""
+            UPDATE tasks SET status = 'failed', lease_expires = NULL, updated = ?
+            WHERE status = 'running' AND lease_expires < ? AND attempts >= ?
+        """, (now, now, max_attempts))
+        row = conn.execute("""
+            SELECT cancer_type FROM tasks
+            WHERE attempts < ? AND (status = 'pending' OR (status = 'running' AND lease_expires < ?))
+            ORDER BY cancer_type LIMIT 1
+        """, (max_attempts, now)).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("""
+            UPDATE tasks SET status = 'running', worker_id = ?, lease_expires = ?, attempts = attempts + 1, updated = ?
+            WHERE cancer_type = ?
+        """, (worker_id, now + lease_seconds, now, row[0]))
+        conn.execute("COMMIT")
+        return row[0]
+    finally:
+        conn.close()
+
+def renew_lease(queue_path: str, cancer_type: str, worker_id: str, lease_seconds: float):
+    """Heartbeat: extends the lease. Returns False if the task is no longer held by worker_id."""
+    now = time.time()
+    conn = _connect(queue_path)
+    try:
+        cursor = conn.execute("""
+            UPDATE tasks SET lease_expires = ?, updated = ?
+            WHERE cancer_type = ? AND worker_id = ? AND status = 'running'
+        """, (now + lease_seconds, now, cancer_type, worker_id))
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+def finish_task(queue_path: str, cancer_type: str, worker_id: str, succeeded: bool, max_attempts: int = 3):
+    """
+    Marks a held task done, or returns it to pending (failed once attempts run out).
+    Returns False when worker_id no longer holds the running task (its lease expired
+    and the task was reclaimed or failed), in which case its result is discarded.
+    """
+    now = time.time()
+    conn = _connect(queue_path)
+    try:
+        if succeeded:
+            cursor = conn.execute("""
+                UPDATE tasks SET status = 'done', lease_expires = NULL, updated = ?
+                WHERE cancer_type = ? AND worker_id = ? AND status = 'running'
+            """, (now, cancer_type, worker_id))
+        else:
+            cursor = conn.execute("""
+                UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                 lease_expires = NULL, updated = ?
+                WHERE cancer_type = ? AND worker_id = ? AND status = 'running'
+            """, (max_attempts, now, cancer_type, worker_id))
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+def queue_summary(queue_path: str):
+    """Returns {status: count} over all tasks."""
+    conn = _connect(queue_path)
+    try:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+    finally:
+        conn.close()
+
+def claim_synthesis(queue_path: str, worker_id: str):
+    """
+    Returns True for exactly one worker once every task has finished (done or failed),
+    so the pan-cancer synthesis runs once over the merged outputs.
+    """
+    conn = _connect(queue_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        unfinished = conn.execute("SELECT COUNT(*) FROM tasks WHERE status NOT IN ('done', 'failed')").fetchone()[0]
+        claimed = conn.execute("SELECT value FROM meta WHERE key = 'synthesis_worker'").fetchone()
+        if unfinished or claimed:
+            conn.execute("COMMIT")
+            return False
+        conn.execute("INSERT INTO meta (key, value) VALUES ('synthesis_worker', ?)", (worker_id,))
+        conn.execute("COMMIT")
+        return True
+    finally:
+        conn.close()